@@ -0,0 +1,94 @@
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from oauth2_provider.contrib.rest_framework import OAuth2Authentication
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """
+    Bounded in-process LRU of validated access tokens with their user and
+    application loaded, keyed by the sha256 of the token.
+
+    An entry lives until the token expires or AUTH_TOKEN_CACHE_TTL passes,
+    whichever comes first. Deleted or changed tokens are evicted by
+    signals in this process, the TTL bounds how long other processes
+    keep accepting them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, token):
+        key = hash_token(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            access_token, deadline = entry
+            if timezone.now() >= deadline:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return access_token
+
+    def set(self, token, access_token):
+        ttl = timedelta(seconds=settings.AUTH_TOKEN_CACHE_TTL)
+        deadline = min(access_token.expires, timezone.now() + ttl)
+        key = hash_token(token)
+        with self._lock:
+            self._entries[key] = (access_token, deadline)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def evict(self, token):
+        with self._lock:
+            self._entries.pop(hash_token(token), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedOAuth2Authentication(OAuth2Authentication):
+    """
+    OAuth2Authentication which skips the AccessToken and User queries for
+    bearer tokens it validated recently
+    """
+
+    def authenticate(self, request):
+        token = self.get_bearer_token(request)
+        if token is None:
+            return super().authenticate(request)
+
+        access_token = token_cache.get(token)
+        if access_token is None:
+            result = super().authenticate(request)
+            if result is not None:
+                token_cache.set(token, result[1])
+            return result
+
+        # copies, so nothing a view sets on them leaks into other requests
+        access_token = copy.copy(access_token)
+        access_token.user = copy.copy(access_token.user)
+        return access_token.user, access_token
+
+    def get_bearer_token(self, request):
+        header = request.headers.get("Authorization", "")
+        scheme, _, token = header.partition(" ")
+        if scheme.lower() != "bearer" or not token.strip():
+            return None
+        return token.strip()
@@ -0,0 +1,37 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Fixed size set membership test without false negatives.
+
+    Sized for `capacity` items at `error_rate` false positives, so a
+    few million media names fit in a handful of megabytes.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.size = math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2
+        )
+        self.hash_count = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray(math.ceil(self.size / 8))
+
+    def _positions(self, item):
+        # double hashing, k positions out of two 64 bit halves
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
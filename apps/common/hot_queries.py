@@ -0,0 +1,21 @@
+from django.utils.module_loading import autodiscover_modules
+
+_registry = {}
+
+
+def register(name):
+    """
+    Registers a function returning a representative queryset of a hot
+    request path, apps declare them in their `hot_queries` module
+    """
+
+    def decorator(func):
+        _registry[name] = func
+        return func
+
+    return decorator
+
+
+def get_hot_queries():
+    autodiscover_modules("hot_queries")
+    return dict(_registry)
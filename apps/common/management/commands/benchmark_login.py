@@ -0,0 +1,76 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    check_password,
+    get_hasher,
+    make_password,
+)
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.common.passwords import get_hasher_pool, verify_password
+
+PASSWORD = "Benchmark@1234"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures password checks per second, and per core, in the request "
+        "thread and in the hasher process pool"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=200)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=None,
+            help="Concurrent logins, twice the pool size by default",
+        )
+
+    def handle(self, *args, **options):
+        logins = options["logins"]
+        workers = settings.PASSWORD_HASH_WORKERS
+        encoded = make_password(PASSWORD)
+        hasher = get_hasher()
+        self.stdout.write(
+            f"{hasher.algorithm}, {getattr(hasher, 'iterations', '-')} "
+            f"iterations, {logins} logins"
+        )
+
+        elapsed = self.measure(
+            lambda: check_password(PASSWORD, encoded), 1, logins
+        )
+        self.report("in process", logins, elapsed, cores=1)
+
+        if not workers:
+            self.stdout.write("PASSWORD_HASH_WORKERS is 0, no pool to measure")
+            return
+
+        # start every worker before timing
+        pool = get_hasher_pool()
+        list(
+            pool.map(check_password, [PASSWORD] * workers, [encoded] * workers)
+        )
+
+        concurrency = options["concurrency"] or workers * 2
+        elapsed = self.measure(
+            lambda: verify_password(PASSWORD, encoded), concurrency, logins
+        )
+        self.report(f"pool of {workers}", logins, elapsed, cores=workers)
+
+    def measure(self, login, concurrency, logins):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as threads:
+            results = list(threads.map(lambda _: login(), range(logins)))
+        elapsed = time.perf_counter() - started
+        if not all(results):
+            raise CommandError("A password check failed")
+        return elapsed
+
+    def report(self, name, logins, elapsed, cores):
+        rate = logins / elapsed
+        self.stdout.write(
+            f"{name}: {rate:.1f} logins/s, {rate / cores:.1f} logins/s per core"
+        )
@@ -0,0 +1,112 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.common.bloom import BloomFilter
+from apps.common.media import (
+    get_reference_fields,
+    get_referenced_names,
+    release_files,
+)
+
+
+def walk_files(root, skip):
+    """
+    Yields (relative name, modification time) of every file below `root`
+    without listing whole trees in memory
+    """
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.path not in skip:
+                        pending.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    name = os.path.relpath(entry.path, root)
+                    yield name.replace(os.sep, "/"), entry.stat().st_mtime
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes files under MEDIA_ROOT that no field in "
+        "MEDIA_REFERENCE_FIELDS references"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=60 * 60 * 24,
+            help="Only consider files older than this many seconds",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of candidates checked and deleted per batch",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.001,
+            help="False positive rate of the referenced names filter",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        options["started"] = time.time()
+        referenced = self.build_filter(options["error_rate"])
+        cutoff = options["started"] - options["min_age"]
+        root = settings.MEDIA_ROOT
+        if not os.path.isdir(root):
+            return
+
+        skip = {os.path.abspath(settings.UPLOAD_SESSION_ROOT)}
+        scanned = collected = 0
+        candidates = []
+        for name, modified in walk_files(root, skip):
+            scanned += 1
+            # a filter hit may be a false positive, such files are kept
+            if modified < cutoff and name not in referenced:
+                candidates.append(name)
+            if len(candidates) >= options["batch_size"]:
+                collected += self.collect(candidates, options)
+                candidates = []
+        collected += self.collect(candidates, options)
+
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Scanned {scanned} files. {verb} {collected} unreferenced"
+            )
+        )
+
+    def build_filter(self, error_rate):
+        fields = list(get_reference_fields())
+        capacity = sum(model._default_manager.count() for model, _ in fields)
+        referenced = BloomFilter(capacity, error_rate)
+        for model, field_name in fields:
+            names = model._default_manager.values_list(field_name, flat=True)
+            for name in names.iterator(chunk_size=5000):
+                if name:
+                    referenced.add(name)
+        return referenced
+
+    def collect(self, candidates, options):
+        """
+        Checks the candidates against the database again, rows created
+        after the filter was built keep their files, and so do blobs an
+        upload deduplicated onto since the scan, as that bumps the mtime
+        """
+        if not candidates:
+            return 0
+        if options["dry_run"]:
+            unreferenced = set(candidates) - get_referenced_names(candidates)
+            for name in sorted(unreferenced):
+                self.stdout.write(name)
+            return len(unreferenced)
+        return len(release_files(candidates, requested_at=options["started"]))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.common.hot_queries import get_hot_queries
+
+
+class Command(BaseCommand):
+    help = "Prints the query plan of every registered hot query"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "names",
+            nargs="*",
+            help="Only explain these hot queries",
+        )
+
+    def handle(self, *args, **options):
+        hot_queries = get_hot_queries()
+
+        names = options["names"] or sorted(hot_queries)
+        unknown = set(names) - set(hot_queries)
+        if unknown:
+            raise CommandError(
+                f"Unknown hot queries: {', '.join(sorted(unknown))}"
+            )
+
+        for name in names:
+            queryset = hot_queries[name]()
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain())
+            self.stdout.write("")
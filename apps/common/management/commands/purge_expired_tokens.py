@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from oauth2_provider.models import AccessToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes expired access tokens in small batches, each in its own "
+        "short transaction, walking the primary key instead of counting"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of tokens deleted per statement",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.0,
+            help="Seconds to pause between batches to let writers through",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        # tokens still backing a refresh token go with it
+        expired = AccessToken.objects.filter(
+            expires__lt=now, refresh_token__isnull=True
+        ).order_by("id")
+
+        last_id = 0
+        purged = 0
+        while True:
+            ids = list(
+                expired.filter(id__gt=last_id).values_list("id", flat=True)[
+                    : options["batch_size"]
+                ]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            AccessToken.objects.filter(id__in=ids).delete()
+            purged += len(ids)
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Purged {purged} expired access tokens")
+        )
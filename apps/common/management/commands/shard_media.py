@@ -0,0 +1,89 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from apps.common.media import count_references, get_reference_fields
+from apps.common.signals import media_moved
+from apps.common.storage import is_sharded_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves media referenced by MEDIA_REFERENCE_FIELDS into the sharded "
+        "content addressed layout, in batches while the site keeps serving"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of rows looked at per batch",
+        )
+        parser.add_argument(
+            "--delete-old",
+            action="store_true",
+            help="Delete old files once nothing references them",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        # a file referenced by several rows or fields is counted once
+        moved, missing = set(), set()
+        for model, field_name in get_reference_fields():
+            storage = model._meta.get_field(field_name).storage
+            rows = model._default_manager.order_by("pk").exclude(
+                **{field_name: ""}
+            )
+
+            last_pk = None
+            while True:
+                batch = (
+                    rows if last_pk is None else rows.filter(pk__gt=last_pk)
+                )
+                batch = list(
+                    batch.values_list("pk", field_name)[
+                        : options["batch_size"]
+                    ]
+                )
+                if not batch:
+                    break
+                last_pk = batch[-1][0]
+
+                names = {
+                    name for _, name in batch if not is_sharded_name(name)
+                }
+                for name in sorted(names):
+                    if not storage.exists(name):
+                        if name not in missing:
+                            self.stderr.write(
+                                f"Missing {model.__name__}: {name}"
+                            )
+                        missing.add(name)
+                        continue
+                    if not options["dry_run"]:
+                        self.move(model, field_name, storage, name, options)
+                    moved.add(name)
+
+        verb = "Would move" if options["dry_run"] else "Moved"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {len(moved)} files, {len(missing)} missing"
+            )
+        )
+
+    def move(self, model, field_name, storage, name, options):
+        """
+        Copies the file to its sharded name first so both names serve the
+        same bytes while rows are switched over, then tells the caches
+        holding the old URL
+        """
+        with storage.open(name, "rb") as old_file:
+            new_name = storage.save(name, File(old_file, name=name))
+
+        rows = model._default_manager.filter(**{field_name: name})
+        pks = list(rows.values_list("pk", flat=True))
+        rows.update(**{field_name: new_name})
+        media_moved.send(sender=model, pks=pks)
+
+        if options["delete_old"] and not count_references(name):
+            storage.delete(name)
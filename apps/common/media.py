@@ -0,0 +1,151 @@
+import logging
+import queue
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+def get_reference_fields():
+    """
+    (model, field name) of every file field listed in
+    MEDIA_REFERENCE_FIELDS as "app_label.Model.field"
+    """
+    for reference in settings.MEDIA_REFERENCE_FIELDS:
+        model_label, field_name = reference.rsplit(".", 1)
+        yield apps.get_model(model_label), field_name
+
+
+def count_references(name):
+    """
+    Number of rows pointing at the stored file `name`, content addressed
+    files are shared so a file may only go once this drops to zero
+    """
+    return sum(
+        model._default_manager.filter(**{field_name: name}).count()
+        for model, field_name in get_reference_fields()
+    )
+
+
+def get_referenced_names(names):
+    """
+    The subset of `names` still referenced by some row, one IN query per
+    reference field
+    """
+    referenced = set()
+    for model, field_name in get_reference_fields():
+        referenced.update(
+            model._default_manager.filter(
+                **{f"{field_name}__in": names}
+            ).values_list(field_name, flat=True)
+        )
+    return referenced
+
+
+def release_files(names, storage=default_storage, requested_at=None):
+    """
+    Deletes the stored files among `names` no row references anymore,
+    returns the deleted names.
+
+    Files written or deduplicated onto less than MEDIA_RELEASE_GRACE
+    seconds before the release was requested are kept, as the upload
+    sharing them may not have committed its row yet. They are left to
+    collect_media_garbage.
+    """
+    names = {name for name in names if name}
+    if not names:
+        return set()
+    if requested_at is None:
+        requested_at = time.time()
+    cutoff = requested_at - settings.MEDIA_RELEASE_GRACE
+
+    released = set()
+    for name in names - get_referenced_names(names):
+        try:
+            modified = storage.get_modified_time(name).timestamp()
+        except FileNotFoundError:
+            continue
+        if modified >= cutoff:
+            continue
+        storage.delete(name)
+        released.add(name)
+    return released
+
+
+class ReleaseQueue:
+    """
+    Deletes released files on a background thread, off the request path.
+
+    Names are checked against every reference field right before they are
+    deleted, so a file uploaded again in the meantime is kept. Names still
+    queued when the process exits are left to collect_media_garbage.
+    Every name carries the time its release was requested.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def put(self, names):
+        requested_at = time.time()
+        if not settings.MEDIA_RELEASE_IN_BACKGROUND:
+            release_files(names, requested_at=requested_at)
+            return
+        for name in names:
+            self._queue.put((name, requested_at))
+        self._start_worker()
+
+    def join(self):
+        """
+        Blocks until every queued name has been handled
+        """
+        self._queue.join()
+
+    def _start_worker(self):
+        with self._lock:
+            if self._worker is not None:
+                return
+            self._worker = threading.Thread(
+                target=self._run_worker, name="media-release", daemon=True
+            )
+            self._worker.start()
+
+    def _run_worker(self):
+        batch_size = settings.MEDIA_RELEASE_BATCH_SIZE
+        while True:
+            items = [self._queue.get()]
+            while len(items) < batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            names = [name for name, _ in items]
+            # the latest request keeps the widest grace for the batch
+            requested_at = max(requested_at for _, requested_at in items)
+            try:
+                release_files(names, requested_at=requested_at)
+            except Exception:
+                logger.exception("Failed to release %d files", len(names))
+            finally:
+                close_old_connections()
+                for _ in items:
+                    self._queue.task_done()
+
+
+release_queue = ReleaseQueue()
+
+
+def queue_release(*names):
+    """
+    Hands files a row stopped using to the release queue once the current
+    transaction commits
+    """
+    names = [name for name in names if name]
+    if names:
+        transaction.on_commit(lambda: release_queue.put(names))
@@ -1,7 +1,172 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import date
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
 
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 100
     page_size_query_param = "page_size"
     max_page_size = 1000
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a tuple of ordering fields.
+
+    Pages are fetched with a WHERE clause on the last seen values instead
+    of an OFFSET, and no total count is computed, so every page costs the
+    same. Views can set `cursor_ordering` to override `ordering`, the last
+    field must be unique.
+    """
+
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    cursor_query_param = "cursor"
+    ordering = ("-created", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(view)
+
+        position, reverse = self.decode_cursor(request, queryset.model)
+        ordering = self.ordering
+        if reverse:
+            ordering = [self._reverse_field(field) for field in ordering]
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(ordering, position)
+            )
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_ordering(self, view):
+        return tuple(getattr(view, "cursor_ordering", self.ordering))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_keyset_filter(self, ordering, position):
+        """
+        Builds `(a < x) OR (a = x AND b < y) ...` for the given ordering
+        """
+        keyset_filter = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equals = {
+                ordering[i].lstrip("-"): position[i] for i in range(index)
+            }
+            keyset_filter |= Q(
+                **equals, **{f"{name}__{lookup}": position[index]}
+            )
+        return keyset_filter
+
+    def get_position(self, instance):
+        return [
+            self._to_primitive(getattr(instance, field.lstrip("-")))
+            for field in self.ordering
+        ]
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]), False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[0]), True)
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({"p": position, "r": int(reverse)})
+        cursor = urlsafe_b64encode(payload.encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, model):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+
+        try:
+            payload = json.loads(urlsafe_b64decode(cursor.encode()))
+            position = payload["p"]
+            reverse = bool(payload["r"])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(
+            self.ordering
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return self.coerce_position(model, position), reverse
+
+    def coerce_position(self, model, position):
+        """
+        Converts the cursor values to the types of the ordering fields so
+        a tampered cursor is rejected here instead of by the database
+        """
+        coerced = []
+        for field, value in zip(self.ordering, position):
+            model_field = model._meta.get_field(field.lstrip("-"))
+            try:
+                value = model_field.to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            coerced.append(value)
+        return coerced
+
+    def _reverse_field(self, field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    def _to_primitive(self, value):
+        # isoformat keeps microseconds, which keyset comparisons rely on
+        if isinstance(value, date):
+            return value.isoformat()
+        return value
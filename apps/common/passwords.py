@@ -0,0 +1,146 @@
+import hashlib
+import hmac
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    check_password,
+    identify_hasher,
+    make_password,
+)
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _setup_worker():
+    django.setup()
+
+
+def get_hasher_pool():
+    """
+    Process pool password hashes are computed in, so PBKDF2 does not hold
+    the GIL of a request worker. It is per process and only started by
+    the first hash, commands that never hash never spawn it.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_setup_worker,
+            )
+        return _executor
+
+
+def reset_hasher_pool(executor):
+    """
+    Drops `executor` once a worker died, the next get_hasher_pool()
+    starts a new pool
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_in_pool(call, fallback):
+    # a pool whose worker died fails every later call, it is replaced once
+    # and the hash computed in process if the new pool breaks as well
+    for attempt in range(2):
+        executor = get_hasher_pool()
+        try:
+            return call(executor)
+        except BrokenProcessPool:
+            reset_hasher_pool(executor)
+    logger.warning("Password hasher pool is broken, hashing in process")
+    return fallback()
+
+
+def verify_password(password, encoded):
+    """
+    check_password in the hasher pool, or in process when
+    PASSWORD_HASH_WORKERS is 0
+    """
+    if not settings.PASSWORD_HASH_WORKERS:
+        return check_password(password, encoded)
+    return _run_in_pool(
+        lambda pool: pool.submit(check_password, password, encoded).result(),
+        lambda: check_password(password, encoded),
+    )
+
+
+def hash_passwords(passwords):
+    """
+    make_password of every password, spread over the hasher pool
+    """
+    workers = settings.PASSWORD_HASH_WORKERS
+    if not workers or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+    chunk_size = max(len(passwords) // (workers * 4), 1)
+    return _run_in_pool(
+        lambda pool: list(
+            pool.map(make_password, passwords, chunksize=chunk_size)
+        ),
+        lambda: [make_password(password) for password in passwords],
+    )
+
+
+def _credential_key(prefix, owner_id, encoded, secret):
+    # the stored hash is part of the key, a changed password or secret
+    # never matches an old entry
+    message = f"{owner_id}:{encoded}:{secret}".encode()
+    digest = hmac.new(
+        settings.SECRET_KEY.encode(), message, hashlib.sha256
+    ).hexdigest()
+    return f"{prefix}_{digest}"
+
+
+def check_user_password(user, password):
+    """
+    Verifies the password of `user` in the hasher pool. Failures are
+    remembered for LOGIN_CREDENTIAL_CACHE_TIMEOUT seconds so retried bad
+    credentials are rejected without hashing again.
+    """
+    key = _credential_key("login_failure", user.pk, user.password, password)
+    if cache.get(key):
+        return False
+
+    if not verify_password(password, user.password):
+        cache.set(key, True, settings.LOGIN_CREDENTIAL_CACHE_TIMEOUT)
+        return False
+
+    # same upgrade User.check_password does for outdated hashers
+    if identify_hasher(user.password).must_update(user.password):
+        user.set_password(password)
+        user.save(update_fields=["password"])
+    return True
+
+
+def check_client_secret(application, client_secret):
+    """
+    Verifies an OAuth application secret, which every login of the app
+    sends, remembering matches for LOGIN_CREDENTIAL_CACHE_TIMEOUT seconds
+    """
+    key = _credential_key(
+        "client_secret",
+        application.pk,
+        application.client_secret,
+        client_secret,
+    )
+    if cache.get(key):
+        return True
+    if not verify_password(client_secret, application.client_secret):
+        return False
+    cache.set(key, True, settings.LOGIN_CREDENTIAL_CACHE_TIMEOUT)
+    return True
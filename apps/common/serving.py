@@ -0,0 +1,88 @@
+import re
+
+from django.utils.http import parse_http_date_safe
+
+from apps.common.storage import is_content_name
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class UnsatisfiableRange(ValueError):
+    """
+    Raised for a byte range starting past the end of the file
+    """
+
+
+def get_etag(name, stat):
+    """
+    Strong ETag of a stored file, its hash when the name is one
+    """
+    if is_content_name(name):
+        return '"%s"' % name.rsplit("/", 1)[-1].split(".", 1)[0]
+    return '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+
+
+def parse_range(header, size):
+    """
+    Inclusive (start, end) of a single range `Range` header, or None when
+    the whole file should be sent, which is also the answer for multiple
+    or malformed ranges
+    """
+    match = RANGE_RE.match((header or "").strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+
+    if not start:
+        if not end:
+            return None
+        suffix = int(end)
+        if not suffix or not size:
+            raise UnsatisfiableRange
+        return max(size - suffix, 0), size - 1
+
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        raise UnsatisfiableRange
+    end = int(end) if end else size - 1
+    return start, min(end, size - 1)
+
+
+def range_applies(request, etag, last_modified):
+    """
+    Whether the `Range` header should be honoured given `If-Range`, which
+    only matches a strong ETag or the exact Last-Modified date
+    """
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith("W/"):
+        return False
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(last_modified)
+
+
+class RangedFile:
+    """
+    Read only view of `length` bytes of an open file from its position.
+
+    It has no fileno on purpose, WSGI servers would otherwise sendfile
+    the rest of the file instead of the requested range.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
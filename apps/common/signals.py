@@ -0,0 +1,38 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from oauth2_provider.models import AccessToken
+
+from apps.common.authentication import token_cache
+from apps.common.media import get_reference_fields, queue_release
+
+# sent with the model and the pks of rows whose file was moved to a new
+# name, so apps caching serialized URLs can drop them
+media_moved = Signal()
+
+
+def release_on_delete(field_name):
+    def file_owner_deleted(sender, instance, **kwargs):
+        """
+        Queues the file of a deleted row, including cascaded deletes
+        """
+        queue_release(getattr(instance, field_name).name)
+
+    return file_owner_deleted
+
+
+for model, field_name in get_reference_fields():
+    post_delete.connect(
+        release_on_delete(field_name),
+        sender=model,
+        weak=False,
+        dispatch_uid=f"release_{model._meta.label}_{field_name}",
+    )
+
+
+@receiver(post_save, sender=AccessToken)
+@receiver(post_delete, sender=AccessToken)
+def access_token_changed(sender, instance, **kwargs):
+    """
+    Evicts revoked or modified tokens from the authentication cache
+    """
+    token_cache.evict(instance.token)
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+from apps.common.utils import uuid_hex
+
+CONTENT_NAME_RE = re.compile(r"^[0-9a-f]{64}(\.[0-9a-z]+)?$")
+EXTENSION_RE = re.compile(r"^\.[0-9a-z]+$")
+
+
+def get_sharded_name(directory, digest, extension):
+    """
+    Spreads files over 65536 subdirectories by the first two bytes of
+    their hash, e.g. posts/ab/cd/abcd....jpg
+    """
+    return os.path.join(directory, digest[:2], digest[2:4], digest + extension)
+
+
+def get_content_extension(filename):
+    """
+    Lowercased extension of `filename`, or "" when it is not one of
+    MEDIA_EXTENSIONS or has characters content names do not allow
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if not EXTENSION_RE.match(extension):
+        return ""
+    return extension if extension[1:] in settings.MEDIA_EXTENSIONS else ""
+
+
+def is_sharded_name(name):
+    """
+    Whether `name` is a content name inside its hash subdirectories
+    """
+    parts = name.split("/")
+    if len(parts) < 3 or not is_content_name(name):
+        return False
+    return parts[-3:-1] == [parts[-1][:2], parts[-1][2:4]]
+
+
+def is_content_name(name):
+    """
+    Whether `name` was written by ContentAddressedStorage, such files
+    never change and can be cached forever
+    """
+    return bool(CONTENT_NAME_RE.match(os.path.basename(name)))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage naming every file after the sha256 of its content.
+
+    The directory and allowed extension of the requested name are kept,
+    with two levels of hash prefixed subdirectories below it. A file
+    whose content is already stored is not written again and gets the
+    existing name, so the same bytes uploaded twice share one blob. Its
+    modification time is bumped instead, which keeps it from being
+    released while the new reference is not committed yet.
+    """
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, "seek"):
+            content.seek(0)
+
+        directory, filename = os.path.split(name)
+        return get_sharded_name(
+            directory, digest.hexdigest(), get_content_extension(filename)
+        )
+
+    def _save(self, name, content):
+        name = self.get_content_name(name, content)
+        try:
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+
+        # written under a unique name first and renamed into place, racing
+        # writers of the same content end up replacing identical bytes
+        directory = os.path.dirname(name)
+        temporary = super()._save(
+            os.path.join(directory, f"tmp-{uuid_hex()}"), content
+        )
+        os.replace(self.path(temporary), self.path(name))
+        return name
@@ -1,3 +1,611 @@
-# from django.test import TestCase
+import hashlib
+import os
+import tempfile
+import time
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from oauth2_provider.models import AccessToken
+from rest_framework.request import Request
+
+from apps.common.authentication import (
+    CachedOAuth2Authentication,
+    token_cache,
+)
+from apps.common.bloom import BloomFilter
+from apps.common.passwords import (
+    check_user_password,
+    hash_passwords,
+    verify_password,
+)
+from apps.common.media import release_files, release_queue
+from apps.common.storage import (
+    ContentAddressedStorage,
+    get_sharded_name,
+    is_sharded_name,
+)
+from apps.posts.factories import PostFactory
+from apps.posts.feed_cache import get_post_fragments
+from apps.posts.models import Post, PostVariant
+from apps.users.factories import (
+    AccessTokenFactory,
+    ApplicationFactory,
+    UserFactory,
+)
+from apps.common.views import serve_media
+
+
+class TestHotQueries(TestCase):
+    """
+    Tests below commands
+    1. Query plans of registered hot queries
+    """
+
+    def test_explain_hot_queries(self):
+        stdout = StringIO()
+        call_command("explain_hot_queries", stdout=stdout)
+
+        output = stdout.getvalue()
+        self.assertIn("posts.feed_page", output)
+        self.assertIn("timeline_viewer_updated_idx", output)
+        self.assertIn("friends.pending_requests", output)
+
+
+class TestContentAddressedStorage(TestCase):
+    """
+    Tests below storage
+    1. Identical content is stored once under its hash
+    2. Content addressed media is served as immutable
+    3. Migration of flat media to the sharded layout
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.location = tempfile.TemporaryDirectory()
+        self.addCleanup(self.location.cleanup)
+        self.storage = ContentAddressedStorage(location=self.location.name)
+
+    def test_duplicate_content_is_shared(self):
+        digest = hashlib.sha256(b"content").hexdigest()
+
+        first = self.storage.save("posts/first.PNG", ContentFile(b"content"))
+        second = self.storage.save("posts/second.png", ContentFile(b"content"))
+        other = self.storage.save("posts/other.png", ContentFile(b"other"))
+
+        self.assertEqual(
+            first, f"posts/{digest[:2]}/{digest[2:4]}/{digest}.png"
+        )
+        self.assertEqual(second, first)
+        self.assertNotEqual(other, first)
+        self.assertTrue(is_sharded_name(first))
+
+        odd = self.storage.save("posts/photo.my-ext", ContentFile(b"odd"))
+        self.assertEqual(
+            odd,
+            get_sharded_name("posts", hashlib.sha256(b"odd").hexdigest(), ""),
+        )
+        self.assertTrue(is_sharded_name(odd))
+        page = self.storage.save("posts/page.HTML", ContentFile(b"<p>"))
+        self.assertEqual(
+            page,
+            get_sharded_name("posts", hashlib.sha256(b"<p>").hexdigest(), ""),
+        )
+        self.assertEqual(
+            len(os.listdir(os.path.dirname(self.storage.path(first)))), 1
+        )
+
+        # a deduplicated save marks the shared blob as recently used
+        old = time.time() - 24 * 60 * 60
+        os.utime(self.storage.path(first), (old, old))
+        self.storage.save("posts/third.png", ContentFile(b"content"))
+        self.assertGreater(os.path.getmtime(self.storage.path(first)), old)
+
+    def test_serve_media_is_immutable(self):
+        name = self.storage.save("posts/photo.png", ContentFile(b"content"))
+        legacy = self.storage.save("legacy.png", ContentFile(b"legacy"))
+        os.rename(
+            self.storage.path(legacy),
+            os.path.join(self.location.name, "photo.png"),
+        )
+
+        request = RequestFactory().get(f"/media/{name}")
+        response = serve_media(request, name, self.location.name)
+        self.assertIn("immutable", response["Cache-Control"])
+
+        response = serve_media(request, "photo.png", self.location.name)
+        self.assertFalse(response.has_header("Cache-Control"))
+
+    def test_shard_media(self):
+        overrides = override_settings(MEDIA_ROOT=self.location.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        os.makedirs(os.path.join(self.location.name, "posts"))
+        with open(self.storage.path("posts/legacy.png"), "wb") as legacy:
+            legacy.write(b"legacy")
+        user = UserFactory.create()
+        posts = [
+            PostFactory.create(user=user, file="posts/legacy.png"),
+            PostFactory.create(user=user, file="posts/legacy.png"),
+            PostFactory.create(user=user, file="posts/missing.png"),
+        ]
+        PostVariant.objects.create(
+            post=posts[2],
+            kind="grid",
+            file="posts/missing.png",
+            width=1,
+            height=1,
+        )
+        cache.clear()
+        get_post_fragments(
+            [posts[0].id], lambda post_ids: {posts[0].id: b"{}"}
+        )
+        version_key = f"post_fragment_version_{posts[0].id}"
+        version = cache.get(version_key)
+
+        stdout = StringIO()
+        call_command(
+            "shard_media", "--dry-run", stdout=stdout, stderr=StringIO()
+        )
+        self.assertIn("Would move 1 files, 1 missing", stdout.getvalue())
+        self.assertEqual(cache.get(version_key), version)
+        self.assertEqual(
+            Post.objects.filter(file="posts/legacy.png").count(), 2
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                "shard_media",
+                "--batch-size=1",
+                "--delete-old",
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+        names = {
+            post.file.name
+            for post in Post.objects.filter(id__in=[posts[0].id, posts[1].id])
+        }
+        self.assertEqual(len(names), 1)
+        # cached fragments no longer carry the old URL
+        self.assertNotEqual(cache.get(version_key), version)
+        name = names.pop()
+        self.assertTrue(is_sharded_name(name))
+        with self.storage.open(name) as sharded:
+            self.assertEqual(sharded.read(), b"legacy")
+        self.assertFalse(self.storage.exists("posts/legacy.png"))
+
+
+class TestMediaServing(TestCase):
+    """
+    Tests below views
+    1. Byte range requests
+    2. Conditional requests
+    3. Offloading to a front proxy
+    4. Only allowed types are rendered inline
+    """
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media_root.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        storage = ContentAddressedStorage(location=media_root.name)
+        self.name = storage.save("posts/clip.mp4", ContentFile(b"0123456789"))
+        self.url = f"/media/{self.name}"
+
+    def get(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        if response.streaming:
+            response.body = b"".join(response.streaming_content)
+        return response
+
+    def test_byte_ranges(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.body, b"0123456789")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Type"], "video/mp4")
+
+        response = self.get(Range="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.body, b"2345")
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(response["Content-Length"], "4")
+
+        response = self.get(Range="bytes=-3")
+        self.assertEqual(response.body, b"789")
+
+        response = self.get(Range="bytes=7-")
+        self.assertEqual(response.body, b"789")
+
+        response = self.get(Range="bytes=10-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+        response = self.get(Range="bytes=0-1,4-5")
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_requests(self):
+        response = self.get()
+        etag = response["ETag"]
+        self.assertEqual(etag, f'"{os.path.basename(self.name)[:64]}"')
+
+        response = self.get(If_None_Match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn("immutable", response["Cache-Control"])
+
+        response = self.get(If_Modified_Since=response["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.get(Range="bytes=0-1", If_Range=etag)
+        self.assertEqual(response.status_code, 206)
+
+        response = self.get(Range="bytes=0-1", If_Range='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+        # weak validators never satisfy If-Range
+        response = self.get(Range="bytes=0-1", If_Range=f"W/{etag}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.body, b"0123456789")
+
+        self.assertEqual(
+            self.client.get("/media/missing.png").status_code, 404
+        )
+        self.assertEqual(self.client.get("/media/../x").status_code, 404)
+
+    def test_sendfile_offload(self):
+        with override_settings(MEDIA_SENDFILE="X-Accel-Redirect"):
+            response = self.get(Range="bytes=0-1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["X-Accel-Redirect"], f"/protected-media/{self.name}"
+        )
+        self.assertEqual(response.content, b"")
+
+        with override_settings(MEDIA_SENDFILE="X-Sendfile"):
+            response = self.get()
+        self.assertTrue(response["X-Sendfile"].endswith(self.name))
+
+    def test_untrusted_types_are_downloaded(self):
+        response = self.get()
+        self.assertEqual(response["Content-Type"], "video/mp4")
+        self.assertNotIn("attachment", response.get("Content-Disposition", ""))
+        self.assertEqual(response["X-Content-Type-Options"], "nosniff")
+
+        # written before uploads were limited to MEDIA_EXTENSIONS
+        for name in ["page.html", "image.svg", "image.svg.gz"]:
+            with open(os.path.join(settings.MEDIA_ROOT, name), "wb") as file:
+                file.write(b"<script>alert(1)</script>")
+            for sendfile in [None, "X-Accel-Redirect"]:
+                with override_settings(MEDIA_SENDFILE=sendfile):
+                    response = self.client.get(f"/media/{name}")
+                self.assertEqual(
+                    response["Content-Type"], "application/octet-stream"
+                )
+                self.assertEqual(response["Content-Disposition"], "attachment")
+                self.assertEqual(
+                    response["Content-Security-Policy"], "sandbox"
+                )
+                self.assertEqual(response["X-Content-Type-Options"], "nosniff")
+                self.assertNotIn("Content-Encoding", response)
+
+
+class TestMediaCleanup(TestCase):
+    """
+    Tests below cleanup
+    1. Files of deleted rows are released unless shared or recently used
+    2. Background release queue
+    3. Garbage collection of unreferenced files
+    4. Garbage collection keeps blobs reused by a pending upload
+    """
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        overrides = override_settings(
+            MEDIA_ROOT=media_root.name, MEDIA_RELEASE_IN_BACKGROUND=False
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = UserFactory.create()
+
+    def save(self, content, name="posts/file.png", age=0):
+        name = default_storage.save(name, ContentFile(content))
+        if age:
+            modified = time.time() - age
+            os.utime(default_storage.path(name), (modified, modified))
+        return name
+
+    def test_deleted_rows_release_files(self):
+        age = settings.MEDIA_RELEASE_GRACE + 60
+        shared = self.save(b"shared", age=age)
+        first = PostFactory.create(user=self.user, file=shared)
+        second = PostFactory.create(user=self.user, file=shared)
+        own = PostFactory.create(
+            user=self.user, file=self.save(b"own", age=age)
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+            own.delete()
+
+        self.assertTrue(default_storage.exists(shared))
+        self.assertFalse(default_storage.exists(own.file.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(shared))
+
+    def test_recently_used_files_are_kept(self):
+        age = settings.MEDIA_RELEASE_GRACE + 60
+        post = PostFactory.create(
+            user=self.user, file=self.save(b"shared", age=age)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+            # an upload deduplicated onto the blob has not committed yet
+            name = self.save(b"shared")
+        self.assertTrue(default_storage.exists(name))
+
+        # once the grace period is over the blob goes
+        requested_at = time.time() + settings.MEDIA_RELEASE_GRACE + 1
+        self.assertEqual(
+            release_files([name], requested_at=requested_at), {name}
+        )
+
+    @override_settings(MEDIA_RELEASE_IN_BACKGROUND=True)
+    def test_release_queue(self):
+        # the worker thread has its own connection outside the test
+        # transaction, so only the hand-off is checked here
+        with mock.patch("apps.common.media.release_files") as release:
+            release_queue.put(["posts/a.png", "posts/b.png"])
+            release_queue.join()
+        release.assert_called_once_with(
+            ["posts/a.png", "posts/b.png"], requested_at=mock.ANY
+        )
+
+    def test_collect_media_garbage(self):
+        referenced = self.save(b"referenced")
+        PostFactory.create(user=self.user, file=referenced)
+        orphan = self.save(b"orphan", "profile_images/file.png")
+        recent = self.save(b"recent")
+
+        old = time.time() - 2 * 24 * 60 * 60
+        for name in (referenced, orphan):
+            os.utime(default_storage.path(name), (old, old))
+
+        stdout = StringIO()
+        call_command("collect_media_garbage", "--dry-run", stdout=stdout)
+        self.assertIn(orphan, stdout.getvalue())
+        self.assertIn("Would delete 1 unreferenced", stdout.getvalue())
+        self.assertTrue(default_storage.exists(orphan))
+
+        call_command("collect_media_garbage", stdout=StringIO())
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(referenced))
+        self.assertTrue(default_storage.exists(recent))
+
+    def test_collect_reused_blob(self):
+        orphan = self.save(b"reused", age=2 * 24 * 60 * 60)
+
+        # an upload deduplicates onto the old blob, its row is not
+        # committed yet when the collection runs
+        self.assertEqual(self.save(b"reused"), orphan)
+        call_command("collect_media_garbage", stdout=StringIO())
+        self.assertTrue(default_storage.exists(orphan))
+
+        # the same when the upload lands between the scan and the delete
+        old = time.time() - 2 * 24 * 60 * 60
+        with mock.patch(
+            "apps.common.management.commands.collect_media_garbage"
+            ".walk_files",
+            return_value=[(orphan, old)],
+        ):
+            call_command("collect_media_garbage", stdout=StringIO())
+        self.assertTrue(default_storage.exists(orphan))
+
+    def test_bloom_filter(self):
+        names = [f"posts/{i}.png" for i in range(1000)]
+        bloom = BloomFilter(len(names), error_rate=0.01)
+        for name in names:
+            bloom.add(name)
+
+        self.assertTrue(all(name in bloom for name in names))
+        misses = sum(f"other/{i}.png" in bloom for i in range(1000))
+        self.assertLess(misses, 50)
+
+
+class TestCachedAuthentication(TestCase):
+    """
+    Tests below authentication
+    1. Validated tokens are served from the cache
+    2. Revoked and expired tokens are rejected
+    3. The cache is bounded
+    """
+
+    def setUp(self):
+        super().setUp()
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.application = ApplicationFactory.create()
+
+    def create_token(self, **kwargs):
+        return AccessTokenFactory.create(
+            user=UserFactory.create(), application=self.application, **kwargs
+        )
+
+    def authenticate(self, token):
+        request = RequestFactory().get(
+            "/", headers={"Authorization": f"Bearer {token}"}
+        )
+        return CachedOAuth2Authentication().authenticate(Request(request))
+
+    def test_cached_token(self):
+        access_token = self.create_token()
+        user, _ = self.authenticate(access_token.token)
+        self.assertEqual(user, access_token.user)
+
+        with self.assertNumQueries(0):
+            user, auth = self.authenticate(access_token.token)
+        self.assertEqual(user, access_token.user)
+        self.assertEqual(auth.token, access_token.token)
+        self.assertIsNone(self.authenticate("unknown"))
+
+    def test_revoked_and_expired_tokens(self):
+        access_token = self.create_token()
+        self.authenticate(access_token.token)
+        access_token.revoke()
+        self.assertIsNone(self.authenticate(access_token.token))
+
+        # expires before the cache TTL would end
+        expiring = self.create_token(
+            expires=timezone.now() + timedelta(seconds=30)
+        )
+        self.assertIsNotNone(self.authenticate(expiring.token))
+        with mock.patch(
+            "django.utils.timezone.now",
+            return_value=timezone.now() + timedelta(seconds=45),
+        ):
+            self.assertIsNone(token_cache.get(expiring.token))
+
+    @override_settings(AUTH_TOKEN_CACHE_SIZE=2)
+    def test_cache_is_bounded(self):
+        tokens = [self.create_token().token for _ in range(3)]
+        for token in tokens:
+            self.authenticate(token)
+
+        self.assertIsNone(token_cache.get(tokens[0]))
+        self.assertIsNotNone(token_cache.get(tokens[1]))
+        self.assertIsNotNone(token_cache.get(tokens[2]))
+
+
+class TestAccessTokenCreation(TestCase):
+    """
+    Tests below APIs
+    1. Logins reuse the unexpired token of the user and application
+    2. Purge of expired tokens
+    3. Password checks in the hasher pool and cached failures
+    4. A broken hasher pool is replaced, then bypassed
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = UserFactory.create()
+        self.application = ApplicationFactory.create(client_secret="secret")
+
+    def login(self):
+        response = self.client.post(
+            reverse("create-access-token"),
+            {
+                "client_id": self.application.client_id,
+                "client_secret": "secret",
+                "username": self.user.username,
+                "password": UserFactory._DEFAULT_PASSWORD,
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()["access_token"]
+
+    def test_token_reuse(self):
+        token = self.login()
+        self.assertEqual(self.login(), token)
+        self.assertEqual(AccessToken.objects.filter(user=self.user).count(), 1)
+
+        # nearly expired tokens are not handed out again
+        AccessToken.objects.filter(token=token).update(
+            expires=timezone.now() + timedelta(minutes=5)
+        )
+        self.assertNotEqual(self.login(), token)
+        self.assertEqual(AccessToken.objects.filter(user=self.user).count(), 2)
+
+    def test_purge_expired_tokens(self):
+        expired = timezone.now() - timedelta(hours=1)
+        for _ in range(5):
+            AccessTokenFactory.create(
+                user=self.user, application=self.application, expires=expired
+            )
+        valid = AccessTokenFactory.create(
+            user=self.user,
+            application=self.application,
+            expires=timezone.now() + timedelta(hours=1),
+        )
+
+        stdout = StringIO()
+        call_command("purge_expired_tokens", "--batch-size=2", stdout=stdout)
+
+        self.assertIn("Purged 5 expired", stdout.getvalue())
+        self.assertEqual(list(AccessToken.objects.all()), [valid])
+
+    def test_password_pool(self):
+        with override_settings(PASSWORD_HASH_WORKERS=1):
+            self.assertTrue(
+                verify_password(
+                    UserFactory._DEFAULT_PASSWORD, self.user.password
+                )
+            )
+            self.assertFalse(verify_password("wrong", self.user.password))
+
+    @override_settings(PASSWORD_HASH_WORKERS=1)
+    def test_broken_password_pool(self):
+        broken = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool
+        broken.map.side_effect = BrokenProcessPool
+        healthy = mock.Mock()
+        healthy.submit.return_value.result.return_value = True
+        password = UserFactory._DEFAULT_PASSWORD
+        with mock.patch(
+            "apps.common.passwords.get_hasher_pool",
+            side_effect=[broken, healthy],
+        ):
+            self.assertTrue(verify_password(password, self.user.password))
+        broken.shutdown.assert_called_once()
+        healthy.submit.assert_called_once()
+
+        # a pool that stays broken hashes in process
+        with (
+            mock.patch(
+                "apps.common.passwords.get_hasher_pool", return_value=broken
+            ),
+            self.assertLogs("apps.common.passwords", "WARNING") as logs,
+        ):
+            self.assertTrue(verify_password(password, self.user.password))
+            self.assertFalse(verify_password("wrong", self.user.password))
+            encoded = hash_passwords(["first", "second"])
+        self.assertEqual(len(logs.output), 3)
+        self.assertTrue(check_password("second", encoded[1]))
+
+    @override_settings(PASSWORD_HASH_WORKERS=0)
+    def test_failed_logins_are_cached(self):
+        with mock.patch(
+            "apps.common.passwords.verify_password", wraps=verify_password
+        ) as verify:
+            self.assertFalse(check_user_password(self.user, "wrong"))
+            self.assertFalse(check_user_password(self.user, "wrong"))
+            self.assertEqual(verify.call_count, 1)
+
+            # a new password hash starts from a clean slate
+            self.user.set_password("wrong")
+            self.assertTrue(check_user_password(self.user, "wrong"))
+            self.assertEqual(verify.call_count, 2)
+
+    @override_settings(PASSWORD_HASH_WORKERS=0)
+    def test_benchmark_login(self):
+        stdout = StringIO()
+        call_command("benchmark_login", "--logins=2", stdout=stdout)
+        self.assertIn("logins/s per core", stdout.getvalue())
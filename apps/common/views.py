@@ -1,14 +1,35 @@
 from datetime import timedelta
+from stat import S_ISREG
+from urllib.parse import quote
+import mimetypes
+import os
 import uuid
 
+from rest_framework import status
 from rest_framework.decorators import api_view, throttle_classes
 from rest_framework.response import Response
 from rest_framework.throttling import AnonRateThrottle
 
 from oauth2_provider.models import Application, AccessToken
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
 from django.utils import timezone
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from apps.common.passwords import check_client_secret, check_user_password
+from apps.common.serving import (
+    RangedFile,
+    UnsatisfiableRange,
+    get_etag,
+    parse_range,
+    range_applies,
+)
+from apps.common.storage import is_content_name
 
 User = get_user_model()
 
@@ -21,18 +42,30 @@ def create_access_token(request):
     username = request.data.get("username")
     password = request.data.get("password")
 
-    try:
-        application = Application.objects.get(
-            client_id=client_id, client_secret=client_secret
-        )
-    except Application.DoesNotExist:
+    # client secrets are stored hashed, they cannot be looked up directly
+    application = Application.objects.filter(client_id=client_id).first()
+    if not application or not check_client_secret(application, client_secret):
         return Response({"error": "Invalid client credentials"}, status=400)
 
     user = User.objects.filter(username=username).first()
-    if not user or not user.check_password(password):
+    if not user or not check_user_password(user, password):
         return Response({"error": "Invalid username or password"}, status=400)
 
-    expires = timezone.now() + timedelta(hours=24)
+    # clients logging in again get the token they already hold instead of
+    # one more row, as long as it has some lifetime left
+    now = timezone.now()
+    min_lifetime = timedelta(seconds=settings.ACCESS_TOKEN_REUSE_MIN_LIFETIME)
+    access_token = (
+        AccessToken.objects.filter(
+            user=user, application=application, expires__gt=now + min_lifetime
+        )
+        .order_by("-expires")
+        .first()
+    )
+    if access_token is not None:
+        return Response({"access_token": access_token.token})
+
+    expires = now + timedelta(hours=24)
     access_token = AccessToken.objects.create(
         user=user,
         application=application,
@@ -41,3 +74,102 @@ def create_access_token(request):
     )
 
     return Response({"access_token": access_token.token})
+
+
+def serve_media(request, path, document_root=None):
+    """
+    Serves uploaded media with conditional and single range requests.
+
+    The body is streamed by FileResponse, which lets the WSGI server use
+    sendfile, or handed to a front proxy when MEDIA_SENDFILE is set.
+    Content addressed files never change so clients and CDNs may cache
+    them without revalidating. Only MEDIA_INLINE_TYPES are rendered by the
+    browser, other files are downloaded in a sandbox.
+    """
+    document_root = document_root or settings.MEDIA_ROOT
+    try:
+        full_path = safe_join(document_root, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404("File does not exist")
+    if not S_ISREG(stat.st_mode):
+        raise Http404("File does not exist")
+
+    etag = get_etag(path, stat)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = media_response(request, path, full_path, stat, etag)
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Accept-Ranges"] = "bytes"
+    response["X-Content-Type-Options"] = "nosniff"
+    if is_content_name(path):
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.MEDIA_CACHE_MAX_AGE,
+            immutable=True,
+        )
+    return response
+
+
+def media_response(request, path, full_path, stat, etag):
+    # compressed files are guessed as their inner type, e.g. .svg.gz, and
+    # are only ever downloaded
+    content_type, encoding = mimetypes.guess_type(full_path)
+    if encoding is None and content_type in settings.MEDIA_INLINE_TYPES:
+        return _media_body_response(
+            request, path, full_path, stat, etag, content_type
+        )
+
+    response = _media_body_response(
+        request, path, full_path, stat, etag, "application/octet-stream"
+    )
+    response["Content-Disposition"] = "attachment"
+    response["Content-Security-Policy"] = "sandbox"
+    return response
+
+
+def _media_body_response(request, path, full_path, stat, etag, content_type):
+    if settings.MEDIA_SENDFILE == "X-Accel-Redirect":
+        # nginx serves ranges and conditionals of internal locations itself
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = quote(
+            settings.MEDIA_SENDFILE_PREFIX + path
+        )
+        return response
+    if settings.MEDIA_SENDFILE == "X-Sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = full_path
+        return response
+
+    size = stat.st_size
+    byte_range = None
+    if range_applies(request, etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except UnsatisfiableRange:
+            response = HttpResponse(
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+            )
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    file = open(full_path, "rb")
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(
+            RangedFile(file, end - start + 1),
+            content_type=content_type,
+            status=status.HTTP_206_PARTIAL_CONTENT,
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+    return response
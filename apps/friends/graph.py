@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.friends.models import Friend
+
+
+def _cached_ids(key, queryset):
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(queryset)
+        cache.set(key, ids, settings.FRIEND_GRAPH_CACHE_TIMEOUT)
+    return ids
+
+
+def get_friend_ids(user_id):
+    """
+    Ids of the users `user_id` has as friends.
+
+    The sets are kept in the default cache and only reach other processes
+    through it, so they back read checks but never stored decisions.
+    """
+    return _cached_ids(
+        f"friend_ids_{user_id}",
+        Friend.objects.filter(user=user_id).values_list("friend", flat=True),
+    )
+
+
+def get_close_friend_ids(user_id):
+    """
+    Ids of the users `user_id` has marked as close friends
+    """
+    return _cached_ids(
+        f"close_friend_ids_{user_id}",
+        Friend.objects.filter(user=user_id, is_close_friend=True).values_list(
+            "friend", flat=True
+        ),
+    )
+
+
+def invalidate_friend_graph(user_id, friend_id):
+    """
+    Drops the cached sets touched by a change of the Friend row between
+    both users, again after commit so concurrent readers cannot put the
+    old sets back
+    """
+    keys = [
+        f"friend_ids_{user_id}",
+        f"close_friend_ids_{user_id}",
+    ]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,37 @@
+from apps.common.hot_queries import register
+from apps.friends.models import Friend, FriendRequest
+
+SAMPLE_ID = 1
+
+
+@register("friends.friend_ids")
+def friend_ids():
+    return Friend.objects.filter(user=SAMPLE_ID).values_list(
+        "friend", flat=True
+    )
+
+
+@register("friends.close_friend_ids")
+def close_friend_ids():
+    return Friend.objects.filter(
+        user=SAMPLE_ID, is_close_friend=True
+    ).values_list("friend", flat=True)
+
+
+@register("friends.friend_of_ids")
+def friend_of_ids():
+    return Friend.objects.filter(friend=SAMPLE_ID).values_list(
+        "user", flat=True
+    )
+
+
+@register("friends.close_friend_of_ids")
+def close_friend_of_ids():
+    return Friend.objects.filter(
+        friend=SAMPLE_ID, is_close_friend=True
+    ).values_list("user", flat=True)
+
+
+@register("friends.pending_requests")
+def pending_requests():
+    return FriendRequest.objects.filter(to_user=SAMPLE_ID, accepted=False)
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("friends", "0002_friend_is_close_friend"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="friend",
+            index=models.Index(
+                fields=["friend", "is_close_friend", "user"],
+                name="friend_friend_close_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="friendrequest",
+            index=models.Index(
+                condition=models.Q(("accepted", False)),
+                fields=["to_user"],
+                name="friendrequest_pending_idx",
+            ),
+        ),
+    ]
@@ -20,6 +20,13 @@ class FriendRequest(TimeStampedModel):
 
     class Meta:
         unique_together = ("from_user", "to_user")
+        indexes = [
+            models.Index(
+                fields=["to_user"],
+                condition=models.Q(accepted=False),
+                name="friendrequest_pending_idx",
+            )
+        ]
 
 
 class Friend(TimeStampedModel):
@@ -35,3 +42,9 @@ class Friend(TimeStampedModel):
 
     class Meta:
         unique_together = ("user", "friend")
+        indexes = [
+            models.Index(
+                fields=["friend", "is_close_friend", "user"],
+                name="friend_friend_close_idx",
+            )
+        ]
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.friends.graph import invalidate_friend_graph
+from apps.friends.models import Friend
+
+
+@receiver(post_save, sender=Friend)
+@receiver(post_delete, sender=Friend)
+def friendship_changed(sender, instance, **kwargs):
+    """
+    Invalidates the cached friend sets of both users
+    """
+    invalidate_friend_graph(instance.user_id, instance.friend_id)
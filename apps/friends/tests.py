@@ -1,6 +1,7 @@
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
+from django.core.cache import cache
 
 from apps.users.factories import (
     UserFactory,
@@ -8,6 +9,10 @@ from apps.users.factories import (
     AccessTokenFactory,
 )
 from apps.friends.models import FriendRequest, Friend
+from apps.friends.graph import (
+    get_close_friend_ids,
+    get_friend_ids,
+)
 from apps.friends.factories import FriendFactory, FriendRequestFactory
 
 
@@ -130,6 +135,7 @@ class TestFriends(APITestCase):
     2. Add close friend
     3. Remove close friend
     4. Remove friend
+    5. Cached friend graph invalidation
     """
 
     def test_friend_list(self):
@@ -234,3 +240,30 @@ class TestFriends(APITestCase):
                 from_user=user1, to_user=user2
             ).exists()
         )
+
+    def test_friend_graph_cache(self):
+        cache.clear()
+        user1 = UserFactory.create(username="user1")
+        user2 = UserFactory.create(username="user2")
+
+        friendship = FriendFactory.create(user=user1, friend=user2)
+
+        self.assertSetEqual(get_friend_ids(user1.id), {user2.id})
+        self.assertSetEqual(get_close_friend_ids(user1.id), set())
+        with self.assertNumQueries(0):
+            self.assertSetEqual(get_friend_ids(user1.id), {user2.id})
+            self.assertSetEqual(get_close_friend_ids(user1.id), set())
+
+        application = ApplicationFactory.create()
+        access_token = AccessTokenFactory.create(
+            user=user1, application=application
+        ).token
+        headers = {"Authorization": f"Bearer {access_token}"}
+
+        url = reverse("friends-add-close-friend", kwargs={"pk": friendship.id})
+        self.client.put(url, headers=headers)
+        self.assertSetEqual(get_close_friend_ids(user1.id), {user2.id})
+
+        url = reverse("friends-remove-friend", kwargs={"pk": friendship.id})
+        self.client.delete(url, headers=headers)
+        self.assertSetEqual(get_friend_ids(user1.id), set())
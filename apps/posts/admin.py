@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from apps.posts.models import Post, PostLike, PostComment
+from apps.posts.models import Post, PostLike, PostComment, PostVariant
 
 
 @admin.register(Post)
@@ -12,9 +12,17 @@ class PostAdmin(admin.ModelAdmin):
         "hide_like_and_view_counts",
         "turn_off_comments",
         "audience",
+        "likes_count",
+        "comments_count",
+        "media_status",
     ]
 
 
+@admin.register(PostVariant)
+class PostVariantAdmin(admin.ModelAdmin):
+    list_display = ["post", "kind", "width", "height"]
+
+
 @admin.register(PostLike)
 class PostLikeAdmin(admin.ModelAdmin):
     list_display = ["post", "liked_by", "is_liked"]
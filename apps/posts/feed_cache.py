@@ -0,0 +1,119 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.common.utils import uuid_hex
+from apps.posts.models import TimelineEntry
+
+
+def _generation_key(user_id):
+    return f"posts_feed_generation_{user_id}"
+
+
+def get_feed_generation(user_id):
+    """
+    Current generation of the user's feed, every cached page is keyed by it
+    """
+    key = _generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, uuid_hex(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def get_feed_cache_key(request):
+    user_id = request.user.id
+    cursor = request.query_params.get("cursor", "")
+    page_size = request.query_params.get("page_size", "")
+    generation = get_feed_generation(user_id)
+    return f"posts_feed_{user_id}_{generation}_{cursor}_{page_size}"
+
+
+def invalidate_feeds(user_ids):
+    """
+    Moves the given users to a new feed generation once the current
+    transaction commits, orphaning all of their cached pages
+    """
+    generations = {
+        _generation_key(user_id): uuid_hex() for user_id in set(user_ids)
+    }
+    if generations:
+        transaction.on_commit(lambda: cache.set_many(generations, None))
+
+
+def invalidate_post_feeds(post):
+    """
+    Invalidates the fragment of the post and the feed of every user who
+    has it in their timeline, only needed when the post leaves the feeds
+    """
+    invalidate_post_fragments([post.pk])
+    invalidate_feeds(
+        TimelineEntry.objects.filter(post=post.pk).values_list(
+            "viewer", flat=True
+        )
+    )
+
+
+def _fragment_version_key(post_id):
+    return f"post_fragment_version_{post_id}"
+
+
+def get_post_fragments(post_ids, render):
+    """
+    Serialized JSON bytes of the given posts, keyed by post id in order.
+
+    Fragments are cached under a per-post version which is read before
+    `render` touches the database, so a fragment rendered from data that
+    a concurrent write has since replaced is stored under a dead version.
+    `render` is called with the ids missing from the cache and returns
+    a dict of post id to bytes.
+    """
+    version_keys = {
+        post_id: _fragment_version_key(post_id) for post_id in post_ids
+    }
+    versions = cache.get_many(version_keys.values())
+
+    new_versions = {
+        key: uuid_hex() for key in version_keys.values() if key not in versions
+    }
+    if new_versions:
+        cache.set_many(new_versions, None)
+        versions.update(new_versions)
+
+    fragment_keys = {
+        post_id: f"post_fragment_{post_id}_{versions[key]}"
+        for post_id, key in version_keys.items()
+    }
+    fragments = cache.get_many(fragment_keys.values())
+
+    missing_ids = [
+        post_id
+        for post_id, key in fragment_keys.items()
+        if key not in fragments
+    ]
+    if missing_ids:
+        rendered = {
+            fragment_keys[post_id]: fragment
+            for post_id, fragment in render(missing_ids).items()
+        }
+        cache.set_many(rendered, settings.POST_FRAGMENT_CACHE_TIMEOUT)
+        fragments.update(rendered)
+
+    return {
+        post_id: fragments[fragment_keys[post_id]]
+        for post_id in post_ids
+        if fragment_keys[post_id] in fragments
+    }
+
+
+def invalidate_post_fragments(post_ids):
+    """
+    Moves the given posts to a new fragment version once the current
+    transaction commits
+    """
+    versions = {
+        _fragment_version_key(post_id): uuid_hex() for post_id in post_ids
+    }
+    if versions:
+        transaction.on_commit(lambda: cache.set_many(versions, None))
@@ -0,0 +1,91 @@
+from django.conf import settings
+
+from apps.common.hot_queries import register
+from apps.posts.models import Post, PostComment, PostLike, TimelineEntry
+from apps.posts.timeline import get_visible_posts
+
+SAMPLE_ID = 1
+PAGE_SIZE = 100
+
+
+@register("posts.post_list")
+def post_list():
+    return Post.objects.filter(user=SAMPLE_ID).order_by("-created", "-id")[
+        :PAGE_SIZE
+    ]
+
+
+@register("posts.feed_page")
+def feed_page():
+    return (
+        TimelineEntry.objects.filter(viewer=SAMPLE_ID)
+        .only("post_id", "post_updated")
+        .order_by("-post_updated", "-post_id")[:PAGE_SIZE]
+    )
+
+
+@register("posts.feed_fragments")
+def feed_fragments():
+    return (
+        Post.objects.filter(id__in=range(SAMPLE_ID, SAMPLE_ID + PAGE_SIZE))
+        .select_related("user", "user__profile")
+        .with_previews()
+    )
+
+
+@register("posts.timeline_repair")
+def timeline_repair():
+    return TimelineEntry.objects.filter(viewer=SAMPLE_ID, post__user=SAMPLE_ID)
+
+
+@register("posts.visible_posts")
+def visible_posts():
+    return get_visible_posts(SAMPLE_ID).order_by("-updated", "-id")[:PAGE_SIZE]
+
+
+@register("posts.audience_posts")
+def audience_posts():
+    return Post.objects.filter(
+        user=SAMPLE_ID, audience__in=["friends", "close_friends"]
+    ).values_list("id", "updated")
+
+
+@register("posts.like_preview")
+def like_preview():
+    return PostLike.objects.filter(post=SAMPLE_ID, is_liked=True).order_by(
+        "-updated", "-id"
+    )[: settings.POST_PREVIEW_LIMIT]
+
+
+@register("posts.comment_preview")
+def comment_preview():
+    return PostComment.objects.filter(post=SAMPLE_ID).order_by(
+        "-created", "-id"
+    )[: settings.POST_PREVIEW_LIMIT]
+
+
+@register("posts.comment_page")
+def comment_page():
+    return (
+        PostComment.objects.filter(post=SAMPLE_ID)
+        .select_related("commented_by__profile")
+        .order_by("-created", "-id")[:PAGE_SIZE]
+    )
+
+
+@register("posts.like_page")
+def like_page():
+    return (
+        PostLike.objects.filter(post=SAMPLE_ID, is_liked=True)
+        .select_related("liked_by__profile")
+        .order_by("-updated", "-id")[:PAGE_SIZE]
+    )
+
+
+@register("posts.liked_by_me")
+def liked_by_me():
+    return PostLike.objects.filter(
+        liked_by=SAMPLE_ID,
+        is_liked=True,
+        post__in=range(SAMPLE_ID, SAMPLE_ID + PAGE_SIZE),
+    ).values_list("post_id", flat=True)
@@ -0,0 +1,44 @@
+"""
+Image resizing run inside the media worker processes.
+
+Nothing here may import Django, workers are spawned without settings and
+only ever see a source path and return temporary file paths.
+"""
+
+import os
+import tempfile
+
+from PIL import Image, ImageOps
+
+
+def render_variants(source_path, sizes, quality=85):
+    """
+    Writes a JPEG rendition of the image at `source_path` for every
+    kind in `sizes`, bounded by the given longest edge and never upscaled.
+
+    Returns a dict of kind to (temporary path, width, height), the caller
+    owns and removes the temporary files.
+    """
+    variants = {}
+    try:
+        with Image.open(source_path) as image:
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            for kind, longest_edge in sizes.items():
+                variant = image.copy()
+                variant.thumbnail((longest_edge, longest_edge))
+
+                fd, path = tempfile.mkstemp(suffix=".jpg")
+                with os.fdopen(fd, "wb") as output:
+                    variant.save(
+                        output,
+                        "JPEG",
+                        quality=quality,
+                        optimize=True,
+                        progressive=True,
+                    )
+                variants[kind] = (path, variant.width, variant.height)
+    except Exception:
+        for path, _, _ in variants.values():
+            os.remove(path)
+        raise
+    return variants
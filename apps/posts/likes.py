@@ -0,0 +1,217 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+from apps.posts.feed_cache import invalidate_feeds, invalidate_post_fragments
+from apps.posts.models import Post, PostLike
+
+logger = logging.getLogger(__name__)
+
+
+def apply_likes(states):
+    """
+    Writes like states with a single upsert and adjusts the likes counter
+    of every post whose liked state flipped.
+
+    `states` maps (post_id, user_id) to the wanted `is_liked` value,
+    states of posts deleted in the meantime are skipped.
+    """
+    with transaction.atomic():
+        post_ids = set(
+            Post.objects.filter(
+                id__in={post_id for post_id, _ in states}
+            ).values_list("id", flat=True)
+        )
+        states = {
+            key: is_liked
+            for key, is_liked in states.items()
+            if key[0] in post_ids
+        }
+        if not states:
+            return
+        user_ids = {user_id for _, user_id in states}
+
+        existing = (
+            PostLike.objects.select_for_update()
+            .filter(post__in=post_ids, liked_by__in=user_ids)
+            .values_list("post_id", "liked_by_id", "is_liked")
+        )
+        previous = {
+            (post_id, user_id): is_liked
+            for post_id, user_id, is_liked in existing
+            if (post_id, user_id) in states
+        }
+
+        changes = {
+            key: is_liked
+            for key, is_liked in states.items()
+            if previous.get(key) != is_liked
+        }
+        if not changes:
+            return
+
+        PostLike.objects.bulk_create(
+            [
+                PostLike(post_id=post_id, liked_by_id=user_id, is_liked=liked)
+                for (post_id, user_id), liked in changes.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["post", "liked_by"],
+            update_fields=["is_liked", "updated"],
+        )
+
+        deltas = defaultdict(int)
+        for key, is_liked in changes.items():
+            if is_liked != previous.get(key, False):
+                deltas[key[0]] += 1 if is_liked else -1
+
+        posts_by_delta = defaultdict(list)
+        for post_id, delta in deltas.items():
+            if delta:
+                posts_by_delta[delta].append(post_id)
+        for delta, delta_post_ids in posts_by_delta.items():
+            Post.objects.filter(id__in=delta_post_ids).update(
+                likes_count=F("likes_count") + delta
+            )
+
+        if deltas:
+            invalidate_post_fragments(list(deltas))
+        # only the likers' pages carry liked_by_me
+        invalidate_feeds(user_id for _, user_id in changes)
+
+
+def get_liked_post_ids(user_id, post_ids):
+    """
+    Ids among `post_ids` the user currently likes, with one IN query
+    """
+    liked_post_ids = set(
+        PostLike.objects.filter(
+            liked_by=user_id, is_liked=True, post__in=post_ids
+        ).values_list("post_id", flat=True)
+    )
+    if settings.POST_LIKE_WRITE_BEHIND:
+        for post_id in post_ids:
+            pending = like_buffer.get_pending_state(post_id, user_id)
+            if pending is True:
+                liked_post_ids.add(post_id)
+            elif pending is False:
+                liked_post_ids.discard(post_id)
+    return liked_post_ids
+
+
+class LikeBuffer:
+    """
+    In-process write-behind buffer for like and unlike taps.
+
+    Toggles are coalesced per (post, user) so only the final state is
+    written, by a background thread every POST_LIKE_FLUSH_INTERVAL
+    seconds using `apply_likes`. The stored state is remembered on the
+    first toggle so pending counter deltas can be shown before the flush,
+    they are summed per post as toggles arrive. When a flush fails the states are written one by one and those that
+    still fail are retried POST_LIKE_FLUSH_RETRIES times before dropping.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._deltas = defaultdict(int)
+        self._flusher = None
+
+    def record(self, post_id, user_id, is_liked):
+        key = (post_id, user_id)
+        with self._lock:
+            pending = self._pending.get(key)
+        if pending is None:
+            stored = (
+                PostLike.objects.filter(post=post_id, liked_by=user_id)
+                .values_list("is_liked", flat=True)
+                .first()
+            )
+            pending = {"stored": bool(stored)}
+
+        with self._lock:
+            pending = self._pending.setdefault(key, pending)
+            self._deltas[post_id] -= self._delta(pending)
+            pending["is_liked"] = is_liked
+            self._deltas[post_id] += self._delta(pending)
+            self._start_flusher()
+
+        # the counter in the post fragment includes the pending delta, the
+        # liker's own feed carries liked_by_me
+        invalidate_post_fragments([post_id])
+        invalidate_feeds([user_id])
+
+    def get_pending_state(self, post_id, user_id):
+        with self._lock:
+            pending = self._pending.get((post_id, user_id))
+        return None if pending is None else pending["is_liked"]
+
+    def get_pending_delta(self, post_id):
+        with self._lock:
+            return self._deltas.get(post_id, 0)
+
+    def _delta(self, pending):
+        is_liked = pending.get("is_liked", pending["stored"])
+        return int(is_liked) - int(pending["stored"])
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._deltas = defaultdict(int)
+
+        states = {key: value["is_liked"] for key, value in pending.items()}
+        try:
+            apply_likes(states)
+        except Exception:
+            logger.exception("Failed to flush %d buffered likes", len(states))
+            # one bad state must not hold back the rest of the batch
+            failed = {}
+            for key, is_liked in states.items():
+                try:
+                    apply_likes({key: is_liked})
+                except Exception:
+                    failed[key] = pending[key]
+            self._requeue(failed)
+
+    def _requeue(self, pending):
+        retries = settings.POST_LIKE_FLUSH_RETRIES
+        dropped = 0
+        with self._lock:
+            for key, value in pending.items():
+                value["attempts"] = value.get("attempts", 0) + 1
+                if value["attempts"] > retries:
+                    dropped += 1
+                    continue
+                # a newer toggle recorded during the flush wins
+                if self._pending.setdefault(key, value) is value:
+                    self._deltas[key[0]] += self._delta(value)
+        if dropped:
+            logger.error("Dropped %d buffered likes after retries", dropped)
+
+    def _start_flusher(self):
+        interval = settings.POST_LIKE_FLUSH_INTERVAL
+        if self._flusher is not None or not interval:
+            return
+        self._flusher = threading.Thread(
+            target=self._run_flusher,
+            args=(interval,),
+            name="like-buffer-flusher",
+            daemon=True,
+        )
+        self._flusher.start()
+        atexit.register(self.flush)
+
+    def _run_flusher(self, interval):
+        while True:
+            time.sleep(interval)
+            self.flush()
+            close_old_connections()
+
+
+like_buffer = LikeBuffer()
@@ -0,0 +1,114 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q, Subquery
+
+from apps.friends.models import Friend
+from apps.posts.models import Post
+from apps.posts.timeline import get_visible_posts
+
+User = get_user_model()
+
+
+def legacy_visible_posts(viewer_id):
+    """
+    The OR + DISTINCT query FeedViewSet used before timelines existed
+    """
+    return Post.objects.filter(
+        Q(
+            audience="friends",
+            user__in=Subquery(
+                Friend.objects.filter(user=viewer_id).values_list(
+                    "friend", flat=True
+                )
+            ),
+        )
+        | Q(audience="close_friends", user__friends__is_close_friend=True)
+    ).distinct()
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates a friend graph inside a rolled back transaction and "
+        "compares plans and timings of the legacy and UNION audience queries"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--friends", type=int, default=100)
+        parser.add_argument("--posts", type=int, default=20)
+        parser.add_argument("--close-ratio", type=float, default=0.1)
+        parser.add_argument("--viewers", type=int, default=20)
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+
+        with transaction.atomic():
+            user_ids = self.generate_graph(options)
+            viewer_ids = random.sample(
+                user_ids, min(options["viewers"], len(user_ids))
+            )
+            page_size = options["page_size"]
+
+            queries = [
+                ("legacy OR + DISTINCT", legacy_visible_posts),
+                ("UNION ALL", get_visible_posts),
+            ]
+            for name, build_query in queries:
+                sample = build_query(viewer_ids[0]).order_by("-updated", "-id")
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self.stdout.write(sample[:page_size].explain())
+
+                started = time.perf_counter()
+                for viewer_id in viewer_ids:
+                    query = build_query(viewer_id).order_by("-updated", "-id")
+                    list(query.values_list("id", flat=True)[:page_size])
+                elapsed = (time.perf_counter() - started) / len(viewer_ids)
+                self.stdout.write(f"{elapsed * 1000:.2f} ms per feed page\n")
+
+            transaction.set_rollback(True)
+
+    def generate_graph(self, options):
+        self.stdout.write("Generating graph...")
+        prefix = f"bench{time.time_ns()}_"
+        users = User.objects.bulk_create(
+            User(username=f"{prefix}{i}", password="!")
+            for i in range(options["users"])
+        )
+        user_ids = [user.id for user in users]
+
+        friends = []
+        friend_count = min(options["friends"], len(user_ids) - 1)
+        for user_id in user_ids:
+            candidates = random.sample(user_ids, friend_count + 1)
+            friend_ids = [i for i in candidates if i != user_id]
+            friends.extend(
+                Friend(
+                    user_id=user_id,
+                    friend_id=friend_id,
+                    is_close_friend=random.random() < options["close_ratio"],
+                )
+                for friend_id in friend_ids[:friend_count]
+            )
+        Friend.objects.bulk_create(friends, batch_size=5000)
+
+        posts = (
+            Post(
+                user_id=user_id,
+                file="posts/bench.jpg",
+                audience=(
+                    "close_friends"
+                    if random.random() < options["close_ratio"]
+                    else "friends"
+                ),
+            )
+            for user_id in user_ids
+            for _ in range(options["posts"])
+        )
+        Post.objects.bulk_create(posts, batch_size=5000)
+        return user_ids
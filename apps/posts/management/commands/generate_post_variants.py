@@ -0,0 +1,81 @@
+from concurrent.futures import as_completed
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.posts.imaging import render_variants
+from apps.posts.media import render_failed, store_variants, submit_render
+from apps.posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders the resized variants of posts whose media is still "
+        "pending, such as posts uploaded before variants existed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Also render posts whose previous attempt failed",
+        )
+        parser.add_argument(
+            "--post",
+            type=int,
+            action="append",
+            dest="post_ids",
+            help="Only render this post id, whatever its status, repeatable",
+        )
+
+    def handle(self, *args, **options):
+        if options["post_ids"]:
+            posts = Post.objects.filter(id__in=options["post_ids"])
+        else:
+            statuses = ["pending"]
+            if options["retry_failed"]:
+                statuses.append("failed")
+            posts = Post.objects.filter(media_status__in=statuses)
+        posts = posts.order_by("id").values_list("id", "file")
+
+        sizes = settings.POST_VARIANT_SIZES
+        storage = Post._meta.get_field("file").storage
+        jobs = [(post_id, storage.path(name)) for post_id, name in posts]
+
+        if settings.POST_MEDIA_WORKERS:
+            futures = {
+                submit_render(path, sizes): post_id for post_id, path in jobs
+            }
+            renders = (
+                (futures[future], future.result)
+                for future in as_completed(futures)
+            )
+        else:
+            renders = (
+                (post_id, partial(render_variants, path, sizes))
+                for post_id, path in jobs
+            )
+
+        ready = original = failed = 0
+        for post_id, render in renders:
+            try:
+                variants = render()
+            except Exception as error:
+                if render_failed(post_id, error) == "original":
+                    original += 1
+                else:
+                    self.stderr.write(f"Post {post_id}: {error}")
+                    failed += 1
+                continue
+            if store_variants(post_id, variants):
+                ready += 1
+            else:
+                failed += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rendered variants of {ready} posts, {failed} failed, "
+                f"{original} kept their original only"
+            )
+        )
@@ -0,0 +1,70 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.posts.models import UploadSession
+from apps.posts.uploads import remove_part
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes expired upload sessions with their partial files, and "
+        "partial files left behind without a session"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of sessions deleted per statement",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        expired = UploadSession.objects.filter(expires__lte=timezone.now())
+
+        purged = 0
+        while True:
+            ids = list(expired.values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            UploadSession.objects.filter(id__in=ids).delete()
+            for session_id in ids:
+                remove_part(UploadSession(id=session_id).path)
+            purged += len(ids)
+
+        orphans = self.purge_orphans()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Purged {purged} expired sessions and {orphans} orphan files"
+            )
+        )
+
+    def purge_orphans(self):
+        """
+        Removes partial files older than a session may live whose session
+        row is gone, such as files of a finalize that failed after commit
+        """
+        root = settings.UPLOAD_SESSION_ROOT
+        if not os.path.isdir(root):
+            return 0
+
+        cutoff = time.time() - settings.UPLOAD_SESSION_TTL
+        stale = {
+            entry.name.removesuffix(".part"): entry.path
+            for entry in os.scandir(root)
+            if entry.name.endswith(".part") and entry.stat().st_mtime < cutoff
+        }
+        alive = {
+            session_id.hex
+            for session_id in UploadSession.objects.filter(
+                id__in=list(stale)
+            ).values_list("id", flat=True)
+        }
+        for name in stale.keys() - alive:
+            remove_part(stale[name])
+        return len(stale.keys() - alive)
@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.posts.timeline import rebuild_timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuilds materialized home timelines from the friend graph"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="user_ids",
+            help="Only rebuild the timeline of this user id, repeatable",
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by("id")
+        if options["user_ids"]:
+            users = users.filter(id__in=options["user_ids"])
+
+        rebuilt = 0
+        for user_id in users.values_list("id", flat=True).iterator():
+            with transaction.atomic():
+                rebuild_timeline(user_id)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} timelines"))
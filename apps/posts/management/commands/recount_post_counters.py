@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from apps.posts.models import Post, PostComment, PostLike
+
+
+def count_subquery(queryset):
+    """
+    Correlated COUNT over rows of `queryset` belonging to the outer post
+    """
+    counts = (
+        queryset.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+class Command(BaseCommand):
+    help = "Recomputes the like and comment counters stored on posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of posts updated per statement",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        likes_count = count_subquery(PostLike.objects.filter(is_liked=True))
+        comments_count = count_subquery(PostComment.objects.all())
+
+        last_id = 0
+        recounted = 0
+        while True:
+            ids = list(
+                Post.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+
+            with transaction.atomic():
+                recounted += Post.objects.filter(id__in=ids).update(
+                    likes_count=likes_count, comments_count=comments_count
+                )
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Recounted {recounted} posts"))
@@ -0,0 +1,163 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from PIL import UnidentifiedImageError
+
+from apps.posts.feed_cache import invalidate_post_fragments
+from apps.posts.imaging import render_variants
+from apps.posts.models import Post, PostVariant
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Process pool shared by every request of this process, started lazily.
+
+    Workers are spawned rather than forked so they never inherit the
+    parent's database connections or threads.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.POST_MEDIA_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def reset_executor(executor):
+    """
+    Drops `executor` once a worker died, the next get_executor() starts a
+    new pool
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def submit_render(source_path, sizes):
+    """
+    Submits a render to the pool, replacing the pool once if it broke
+    """
+    executor = get_executor()
+    try:
+        return executor.submit(render_variants, source_path, sizes)
+    except BrokenProcessPool:
+        reset_executor(executor)
+        return get_executor().submit(render_variants, source_path, sizes)
+
+
+def enqueue_variants(post):
+    """
+    Generates the renditions of the post's file once the current
+    transaction commits, in the worker pool when one is configured
+    """
+    post_id, source_path = post.id, post.file.path
+    transaction.on_commit(partial(_submit, post_id, source_path))
+
+
+def _submit(post_id, source_path):
+    # runs after the post is committed, an error here must not turn the
+    # upload response into a 500
+    sizes = settings.POST_VARIANT_SIZES
+    if not settings.POST_MEDIA_WORKERS:
+        try:
+            variants = render_variants(source_path, sizes)
+        except Exception as error:
+            render_failed(post_id, error)
+        else:
+            store_variants(post_id, variants)
+        return
+
+    try:
+        future = submit_render(source_path, sizes)
+    except Exception:
+        logger.exception("Failed to enqueue variants of post %s", post_id)
+        mark_failed(post_id)
+        return
+    future.add_done_callback(partial(_store_result, post_id))
+
+
+def _store_result(post_id, future):
+    # runs on the pool's management thread, which has its own connection
+    try:
+        try:
+            variants = future.result()
+        except Exception as error:
+            render_failed(post_id, error)
+        else:
+            store_variants(post_id, variants)
+    finally:
+        close_old_connections()
+
+
+def store_variants(post_id, variants):
+    """
+    Saves rendered temporary files through the storage backend, records
+    them on the post and marks its media ready, returns whether it did
+    """
+    try:
+        with transaction.atomic():
+            PostVariant.objects.filter(post=post_id).delete()
+            records = []
+            for kind, (path, width, height) in variants.items():
+                record = PostVariant(
+                    post_id=post_id, kind=kind, width=width, height=height
+                )
+                with open(path, "rb") as rendered:
+                    record.file.save(
+                        f"{post_id}_{kind}.jpg", File(rendered), save=False
+                    )
+                records.append(record)
+            PostVariant.objects.bulk_create(records)
+            Post.objects.filter(id=post_id).update(media_status="ready")
+            invalidate_post_fragments([post_id])
+    except Exception:
+        logger.exception("Failed to store variants of post %s", post_id)
+        mark_failed(post_id)
+        return False
+    finally:
+        for path, _, _ in variants.values():
+            os.remove(path)
+    return True
+
+
+def render_failed(post_id, error):
+    """
+    Records why no variants were rendered, returns the new media status
+    """
+    if isinstance(error, UnidentifiedImageError):
+        # videos and other files are served as uploaded
+        logger.info("Post %s is not an image, no variants rendered", post_id)
+        status = "original"
+    else:
+        logger.error(
+            "Failed to render variants of post %s", post_id, exc_info=error
+        )
+        status = "failed"
+    set_media_status(post_id, status)
+    return status
+
+
+def mark_failed(post_id):
+    set_media_status(post_id, "failed")
+
+
+def set_media_status(post_id, status):
+    Post.objects.filter(id=post_id).update(media_status=status)
+    invalidate_post_fragments([post_id])
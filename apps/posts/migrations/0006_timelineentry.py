@@ -0,0 +1,84 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_timelines(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    Friend = apps.get_model("friends", "Friend")
+    TimelineEntry = apps.get_model("posts", "TimelineEntry")
+
+    for post in Post.objects.iterator():
+        if post.audience == "close_friends":
+            viewer_ids = Friend.objects.filter(
+                user=post.user_id, is_close_friend=True
+            ).values_list("friend", flat=True)
+        else:
+            viewer_ids = Friend.objects.filter(
+                friend=post.user_id
+            ).values_list("user", flat=True)
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    viewer_id=viewer_id,
+                    post_id=post.id,
+                    post_updated=post.updated,
+                )
+                for viewer_id in viewer_ids
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0005_postlike_is_liked"),
+        ("friends", "0002_friend_is_close_friend"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TimelineEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("post_updated", models.DateTimeField()),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline_entries",
+                        to="posts.post",
+                    ),
+                ),
+                (
+                    "viewer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["viewer", "-post_updated", "-post"],
+                        name="timeline_viewer_updated_idx",
+                    )
+                ],
+                "unique_together": {("viewer", "post")},
+            },
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
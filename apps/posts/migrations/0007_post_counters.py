@@ -0,0 +1,40 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:38
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+
+    posts = Post.objects.annotate(
+        likes_total=Count(
+            "likes", filter=Q(likes__is_liked=True), distinct=True
+        ),
+        comments_total=Count("comments", distinct=True),
+    )
+    for post in posts.iterator():
+        post.likes_count = post.likes_total
+        post.comments_count = post.comments_total
+        post.save(update_fields=["likes_count", "comments_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0006_timelineentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="comments_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="likes_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
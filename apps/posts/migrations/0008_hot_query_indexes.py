@@ -0,0 +1,44 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0007_post_counters"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["user", "-created", "-id"],
+                name="post_user_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["user", "audience", "-updated"],
+                name="post_user_audience_updated_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="postcomment",
+            index=models.Index(
+                fields=["post", "-created", "-id"],
+                name="postcomment_post_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="postlike",
+            index=models.Index(
+                condition=models.Q(("is_liked", True)),
+                fields=["post", "-updated", "-id"],
+                name="postlike_post_liked_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0008_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="media_status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("ready", "Ready"),
+                    ("original", "Original only"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                max_length=10,
+            ),
+        ),
+        migrations.CreateModel(
+            name="PostVariant",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("grid", "Grid"),
+                            ("feed", "Feed"),
+                            ("full", "Full"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("file", models.FileField(upload_to="posts/variants/")),
+                ("width", models.PositiveIntegerField()),
+                ("height", models.PositiveIntegerField()),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="variants",
+                        to="posts.post",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("post", "kind")},
+            },
+        ),
+    ]
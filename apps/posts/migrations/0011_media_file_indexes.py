@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0010_uploadsession"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="post",
+            name="file",
+            field=models.FileField(db_index=True, upload_to="posts/"),
+        ),
+        migrations.AlterField(
+            model_name="postvariant",
+            name="file",
+            field=models.FileField(db_index=True, upload_to="posts/variants/"),
+        ),
+    ]
@@ -1,4 +1,9 @@
+import os
+import uuid
+
+from django.conf import settings
 from django.db import models
+from django.db.models import Prefetch
 from django.contrib.auth import get_user_model
 
 from apps.common.models import TimeStampedModel
@@ -6,6 +11,37 @@ from apps.common.models import TimeStampedModel
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    def with_previews(self):
+        """
+        Prefetches the most recent likes and comments of every post, with
+        their authors and profiles, in a single windowed query per relation
+        """
+        limit = settings.POST_PREVIEW_LIMIT
+        likes = (
+            PostLike.objects.filter(is_liked=True)
+            .select_related("liked_by__profile")
+            .order_by("-updated", "-id")
+        )
+        comments = PostComment.objects.select_related(
+            "commented_by__profile"
+        ).order_by("-created", "-id")
+        return self.prefetch_related(
+            Prefetch("likes", queryset=likes[:limit], to_attr="recent_likes"),
+            Prefetch(
+                "comments",
+                queryset=comments[:limit],
+                to_attr="recent_comments",
+            ),
+        )
+
+    def with_variants(self):
+        """
+        Prefetches the resized renditions of every post
+        """
+        return self.prefetch_related("variants")
+
+
 class Post(TimeStampedModel):
     """
     Model to save the post in database
@@ -15,12 +51,18 @@ class Post(TimeStampedModel):
         ("friends", "Friends"),
         ("close_friends", "Close Friends"),
     )
+    MEDIA_STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("ready", "Ready"),
+        ("original", "Original only"),
+        ("failed", "Failed"),
+    )
     user = models.ForeignKey(
         User, related_name="posts", on_delete=models.CASCADE
     )
 
     # post related fields
-    file = models.FileField(upload_to="posts/")
+    file = models.FileField(upload_to="posts/", db_index=True)
     caption = models.CharField(max_length=300, null=True, blank=True)
     location = models.CharField(max_length=100, null=True, blank=True)
     music = models.CharField(max_length=50, null=True, blank=True)
@@ -29,15 +71,56 @@ class Post(TimeStampedModel):
     audience = models.CharField(
         max_length=20, choices=AUDIENCE_CHOICES, default="friends"
     )
+    # renditions are generated off the request path, see apps.posts.media
+    media_status = models.CharField(
+        max_length=10, choices=MEDIA_STATUS_CHOICES, default="pending"
+    )
+
+    # denormalized counters, only ever changed through F() updates
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.id} : {self.user.username} - {self.audience}"
 
-    def get_likes_count(self):
-        return self.likes.filter(is_liked=True).count()
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "-created", "-id"],
+                name="post_user_created_idx",
+            ),
+            models.Index(
+                fields=["user", "audience", "-updated"],
+                name="post_user_audience_updated_idx",
+            ),
+        ]
+
+
+class PostVariant(TimeStampedModel):
+    """
+    Resized rendition of a post's file
+    """
 
-    def get_comments_count(self):
-        return self.comments.count()
+    KIND_CHOICES = (
+        ("grid", "Grid"),
+        ("feed", "Feed"),
+        ("full", "Full"),
+    )
+    post = models.ForeignKey(
+        Post, related_name="variants", on_delete=models.CASCADE
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    file = models.FileField(upload_to="posts/variants/", db_index=True)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+
+    def __str__(self) -> str:
+        return f"{self.post_id} - {self.kind}"
+
+    class Meta:
+        unique_together = ("post", "kind")
 
 
 class PostLike(TimeStampedModel):
@@ -58,6 +141,13 @@ class PostLike(TimeStampedModel):
 
     class Meta:
         unique_together = ("post", "liked_by")
+        indexes = [
+            models.Index(
+                fields=["post", "-updated", "-id"],
+                condition=models.Q(is_liked=True),
+                name="postlike_post_liked_idx",
+            )
+        ]
 
 
 class PostComment(TimeStampedModel):
@@ -72,3 +162,65 @@ class PostComment(TimeStampedModel):
         User, related_name="user_comments", on_delete=models.CASCADE
     )
     comment = models.TextField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["post", "-created", "-id"],
+                name="postcomment_post_created_idx",
+            )
+        ]
+
+
+class TimelineEntry(models.Model):
+    """
+    Materialized home timeline, one row per viewer and visible post
+    """
+
+    viewer = models.ForeignKey(
+        User, related_name="timeline", on_delete=models.CASCADE
+    )
+    post = models.ForeignKey(
+        Post, related_name="timeline_entries", on_delete=models.CASCADE
+    )
+    # copy of Post.updated so the feed is a range scan on a single index
+    post_updated = models.DateTimeField()
+
+    def __str__(self) -> str:
+        return f"{self.viewer_id} - {self.post_id}"
+
+    class Meta:
+        unique_together = ("viewer", "post")
+        indexes = [
+            models.Index(
+                fields=["viewer", "-post_updated", "-post"],
+                name="timeline_viewer_updated_idx",
+            )
+        ]
+
+
+class UploadSession(TimeStampedModel):
+    """
+    Resumable upload of a post file, received in chunks appended to a
+    temporary file until it is finalized into a Post
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        User, related_name="upload_sessions", on_delete=models.CASCADE
+    )
+    filename = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    expires = models.DateTimeField(db_index=True)
+    # set while a chunk or the finalization is in flight, see uploads.py
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"{self.id} : {self.offset}/{self.total_size}"
+
+    @property
+    def path(self):
+        return os.path.join(
+            settings.UPLOAD_SESSION_ROOT, f"{self.id.hex}.part"
+        )
@@ -1,8 +1,6 @@
 from rest_framework.permissions import BasePermission
 
-from django.db.models import Q
-
-from apps.friends.models import Friend
+from apps.friends.graph import get_close_friend_ids, get_friend_ids
 
 
 class MustBeFriendPermission(BasePermission):
@@ -11,13 +9,21 @@ class MustBeFriendPermission(BasePermission):
     """
 
     def has_object_permission(self, request, view, post):
-        post_owner = post.user
-        requested_user = request.user
+        post_owner_id = post.user_id
+        requested_user_id = request.user.id
 
         if post.audience == "close_friends":
-            return Friend.objects.filter(
-                user=post_owner, friend=requested_user, is_close_friend=True
-            ).exists()
+            return requested_user_id in get_close_friend_ids(post_owner_id)
         else:
-            filters = Q(user=requested_user) & Q(friend=post_owner)
-            return Friend.objects.filter(filters).exists()
+            return post_owner_id in get_friend_ids(requested_user_id)
+
+
+class PostViewerPermission(MustBeFriendPermission):
+    """
+    Post owner or the friends allowed by the post audience
+    """
+
+    def has_object_permission(self, request, view, post):
+        if post.user_id == request.user.id:
+            return True
+        return super().has_object_permission(request, view, post)
@@ -1,8 +1,19 @@
+import os
+
 from rest_framework import serializers
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ObjectDoesNotExist
 
-from apps.posts.models import Post, PostComment, PostLike
+from apps.posts.likes import like_buffer
+from apps.posts.models import (
+    Post,
+    PostComment,
+    PostLike,
+    PostVariant,
+    UploadSession,
+)
 
 User = get_user_model()
 
@@ -14,7 +25,7 @@ class PostCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Post
-        fields = ["id"]
+        fields = ["id", "media_status"]
 
 
 class PostUpdateSerializer(serializers.ModelSerializer):
@@ -33,17 +44,39 @@ class PostUpdateSerializer(serializers.ModelSerializer):
             "audience",
         ]
 
+    def update(self, instance, validated_data):
+        # only write the edited columns so concurrent counter updates on
+        # the same row are not overwritten with stale values
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, "updated"])
+        return instance
+
+
+class PostVariantSerializer(serializers.ModelSerializer):
+    """
+    Serializes a resized rendition of a post's file
+    """
+
+    class Meta:
+        model = PostVariant
+        fields = ("kind", "file", "width", "height")
+
 
 class PostSerializer(serializers.ModelSerializer):
     """
     Serializer to send the JSON response
     """
 
+    variants = PostVariantSerializer(many=True, read_only=True)
+
     class Meta:
         model = Post
         fields = [
             "id",
             "file",
+            "media_status",
+            "variants",
         ]
 
 
@@ -56,19 +89,28 @@ class PostDetailSerializer(serializers.ModelSerializer):
     comments_count = serializers.SerializerMethodField()
     likes = serializers.SerializerMethodField()
     comments = serializers.SerializerMethodField()
+    variants = PostVariantSerializer(many=True, read_only=True)
 
     def get_likes_count(self, obj):
-        return obj.get_likes_count()
+        if settings.POST_LIKE_WRITE_BEHIND:
+            return obj.likes_count + like_buffer.get_pending_delta(obj.id)
+        return obj.likes_count
 
     def get_comments_count(self, obj):
-        return obj.get_comments_count()
+        return obj.comments_count
 
     def get_likes(self, obj):
-        likes = obj.likes.filter(is_liked=True).order_by("-updated")
+        likes = getattr(obj, "recent_likes", None)
+        if likes is None:
+            likes = obj.likes.filter(is_liked=True).order_by("-updated", "-id")
+            likes = likes[: settings.POST_PREVIEW_LIMIT]
         return PostLikeSerializer(likes, many=True).data
 
     def get_comments(self, obj):
-        comments = obj.comments.all().order_by("-updated")
+        comments = getattr(obj, "recent_comments", None)
+        if comments is None:
+            comments = obj.comments.order_by("-created", "-id")
+            comments = comments[: settings.POST_PREVIEW_LIMIT]
         return PostCommentSerializer(comments, many=True).data
 
     class Meta:
@@ -82,6 +124,8 @@ class PostDetailSerializer(serializers.ModelSerializer):
             "audience",
             "user",
             "file",
+            "media_status",
+            "variants",
             "likes_count",
             "comments_count",
             "likes",
@@ -102,7 +146,7 @@ class PostLikeSerializer(serializers.ModelSerializer):
     def get_profile_picture(self, post):
         try:
             return post.liked_by.profile.profile_image.url
-        except ValueError:
+        except (ValueError, ObjectDoesNotExist):
             return None
 
     class Meta:
@@ -122,7 +166,7 @@ class PostCommentSerializer(serializers.ModelSerializer):
     def get_profile_picture(self, post):
         try:
             return post.commented_by.profile.profile_image.url
-        except ValueError:
+        except (ValueError, ObjectDoesNotExist):
             return None
 
     class Meta:
@@ -164,3 +208,46 @@ class PostCommentCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = PostComment
         fields = ["post", "commented_by", "comment"]
+
+
+class PostLikeActionSerializer(serializers.Serializer):
+    """
+    Single like or unlike action of a batch
+    """
+
+    post = serializers.IntegerField()
+    action = serializers.ChoiceField(choices=["like", "unlike"])
+
+
+class PostLikeBatchSerializer(serializers.Serializer):
+    """
+    Validates a batch of like and unlike actions
+    """
+
+    likes = PostLikeActionSerializer(
+        many=True, allow_empty=False, max_length=100
+    )
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """
+    Starts a resumable upload and reports how far it got
+    """
+
+    class Meta:
+        model = UploadSession
+        fields = ["id", "filename", "total_size", "offset", "expires"]
+        read_only_fields = ["id", "offset", "expires"]
+
+    def validate_filename(self, filename):
+        filename = os.path.basename(filename)
+        if not filename:
+            raise serializers.ValidationError("Please enter a file name!")
+        return filename
+
+    def validate_total_size(self, total_size):
+        if not 0 < total_size <= settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Size must be between 1 and {settings.UPLOAD_MAX_SIZE} bytes"
+            )
+        return total_size
@@ -0,0 +1,71 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from apps.common.signals import media_moved
+from apps.friends.models import Friend
+from apps.posts.feed_cache import (
+    invalidate_feeds,
+    invalidate_post_feeds,
+    invalidate_post_fragments,
+)
+from apps.posts.models import Post, PostComment, PostLike, PostVariant
+from apps.posts.timeline import fan_out_post, sync_timeline
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, **kwargs):
+    """
+    Keeps the materialized timelines in line with post audience
+    """
+    invalidate_post_fragments([instance.pk])
+    invalidate_feeds(fan_out_post(instance))
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    """
+    Timeline rows cascade with the post, only the cached feeds need to go
+    """
+    invalidate_post_feeds(instance)
+
+
+@receiver(post_save, sender=Friend)
+@receiver(post_delete, sender=Friend)
+def friendship_changed(sender, instance, **kwargs):
+    """
+    Repairs both timelines when a friendship is added, removed or
+    marked as close friend
+    """
+    sync_timeline(instance.user_id, instance.friend_id)
+    sync_timeline(instance.friend_id, instance.user_id)
+    invalidate_feeds([instance.user_id, instance.friend_id])
+
+
+@receiver(media_moved)
+def media_moved_fragments(sender, pks, **kwargs):
+    """
+    Drops the fragments embedding the URL of a moved file, profile images
+    appear in the like and comment previews of other posts
+    """
+    if sender is Post:
+        post_ids = set(pks)
+    elif sender is PostVariant:
+        post_ids = set(
+            PostVariant.objects.filter(pk__in=pks).values_list(
+                "post", flat=True
+            )
+        )
+    elif sender._meta.label == "users.UserProfile":
+        user_ids = sender.objects.filter(pk__in=pks).values("user")
+        post_ids = set(
+            PostLike.objects.filter(liked_by__in=user_ids).values_list(
+                "post", flat=True
+            )
+        ) | set(
+            PostComment.objects.filter(commented_by__in=user_ids).values_list(
+                "post", flat=True
+            )
+        )
+    else:
+        return
+    invalidate_post_fragments(list(post_ids))
@@ -1,11 +1,47 @@
+import hashlib
+import json
+import os
+import tempfile
+from base64 import urlsafe_b64encode
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
 from rest_framework.test import APITestCase
 from rest_framework import status
 
+from django.conf import settings
 from django.urls import reverse
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+
+from PIL import Image
 
-from apps.posts.models import Post, PostComment, PostLike
-from apps.posts.factories import PostFactory
+from apps.common.authentication import token_cache
+from apps.posts.models import (
+    Post,
+    PostComment,
+    PostLike,
+    TimelineEntry,
+    UploadSession,
+)
+from apps.posts.factories import (
+    PostFactory,
+    PostLikeFactory,
+    PostCommentFactory,
+)
+from apps.posts.feed_cache import get_feed_generation
+from apps.posts.media import submit_render
+from apps.posts.likes import apply_likes, like_buffer
+from apps.posts.serializers import FeedSerializer
+from apps.posts.timeline import rebuild_timeline
+from apps.posts.uploads import advance_session, claim_session
 from apps.users.factories import (
     UserFactory,
     ApplicationFactory,
@@ -20,8 +56,15 @@ class TestPostCreation(APITestCase):
     1. List of user created posts
     2. Post detail API
     3. Post file upload and metadata creation
+    4. Resized variants rendered after upload
+    5. Broken render pools are replaced
     """
 
+    def make_image(self, width, height):
+        output = BytesIO()
+        Image.new("RGB", (width, height), "purple").save(output, "PNG")
+        return output.getvalue()
+
     def test_post_list(self):
         user = UserFactory.create()
         post1 = PostFactory.create(user=user)
@@ -40,10 +83,73 @@ class TestPostCreation(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         created_post_ids = [post1.id, post2.id]
-        response_post_ids = sorted([p["id"] for p in response.json()])
+        response_post_ids = sorted(
+            [p["id"] for p in response.json()["results"]]
+        )
 
         self.assertListEqual(created_post_ids, response_post_ids)
 
+    def test_post_list_cursor_pagination(self):
+        user = UserFactory.create()
+        posts = PostFactory.create_batch(3, user=user)
+
+        application = ApplicationFactory.create()
+        access_token = AccessTokenFactory.create(
+            user=user, application=application
+        ).token
+        headers = {"Authorization": f"Bearer {access_token}"}
+
+        url = reverse("post-list")
+        response = self.client.get(url, {"page_size": 2}, headers=headers)
+        first_page = response.json()
+
+        self.assertNotIn("count", first_page)
+        self.assertIsNone(first_page["previous"])
+        self.assertListEqual(
+            [p["id"] for p in first_page["results"]],
+            [posts[2].id, posts[1].id],
+        )
+
+        second_page = self.client.get(
+            first_page["next"], headers=headers
+        ).json()
+        self.assertIsNone(second_page["next"])
+        self.assertListEqual(
+            [p["id"] for p in second_page["results"]], [posts[0].id]
+        )
+
+        previous_page = self.client.get(
+            second_page["previous"], headers=headers
+        ).json()
+        self.assertListEqual(previous_page["results"], first_page["results"])
+
+    def test_post_list_tampered_cursor(self):
+        user = UserFactory.create()
+        PostFactory.create(user=user)
+
+        application = ApplicationFactory.create()
+        access_token = AccessTokenFactory.create(
+            user=user, application=application
+        ).token
+        headers = {"Authorization": f"Bearer {access_token}"}
+
+        url = reverse("post-list")
+        positions = [
+            ["2024-01-01T00:00:00+00:00", "abc"],
+            ["yesterday", 1],
+            [None, 1],
+            [["2024-01-01"], {"id": 1}],
+        ]
+        for position in positions:
+            payload = json.dumps({"p": position, "r": 0}).encode()
+            cursor = urlsafe_b64encode(payload).decode()
+            response = self.client.get(
+                url, {"cursor": cursor}, headers=headers
+            )
+            self.assertEqual(
+                response.status_code, status.HTTP_404_NOT_FOUND, position
+            )
+
     def test_post_detail(self):
         user = UserFactory.create()
         post1 = PostFactory.create(user=user)
@@ -105,13 +211,281 @@ class TestPostCreation(APITestCase):
             ).exists()
         )
 
+    @override_settings(POST_MEDIA_WORKERS=0)
+    def test_post_variants(self):
+        user = UserFactory.create()
+        application = ApplicationFactory.create()
+        access_token = AccessTokenFactory(
+            user=user, application=application
+        ).token
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Disposition": "attachment; filename=photo.png",
+        }
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("post-upload-file"),
+                self.make_image(1600, 1200),
+                content_type="image/png",
+                headers=headers,
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["media_status"], "pending")
+
+        post = Post.objects.get(id=response.json()["id"])
+        self.assertEqual(post.media_status, "ready")
+        sizes = {
+            variant.kind: (variant.width, variant.height)
+            for variant in post.variants.all()
+        }
+        self.assertEqual(
+            sizes,
+            {"grid": (320, 240), "feed": (1080, 810), "full": (1600, 1200)},
+        )
+
+        headers.pop("Content-Disposition")
+        response = self.client.get(
+            reverse("post-detail", kwargs={"pk": post.id}), headers=headers
+        )
+        self.assertEqual(
+            {variant["kind"] for variant in response.json()["variants"]},
+            {"grid", "feed", "full"},
+        )
+
+    @override_settings(POST_MEDIA_WORKERS=2)
+    def test_broken_media_pool(self):
+        broken = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool
+        healthy = mock.Mock()
+        with mock.patch(
+            "apps.posts.media.get_executor", side_effect=[broken, healthy]
+        ):
+            submit_render("photo.png", {})
+        broken.shutdown.assert_called_once()
+        healthy.submit.assert_called_once()
+
+        # a pool that stays broken fails the post, not the upload
+        user = UserFactory.create()
+        access_token = AccessTokenFactory(
+            user=user, application=ApplicationFactory.create()
+        ).token
+        with (
+            mock.patch("apps.posts.media.get_executor", return_value=broken),
+            self.assertLogs("apps.posts.media", "ERROR"),
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse("post-upload-file"),
+                    self.make_image(10, 10),
+                    content_type="image/png",
+                    headers={
+                        "Authorization": f"Bearer {access_token}",
+                        "Content-Disposition": "attachment; filename=a.png",
+                    },
+                )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        post = Post.objects.get(id=response.json()["id"])
+        self.assertEqual(post.media_status, "failed")
+
+    @override_settings(POST_MEDIA_WORKERS=0)
+    def test_generate_post_variants_command(self):
+        image = PostFactory.create(
+            user=UserFactory.create(),
+            file=SimpleUploadedFile("photo.png", self.make_image(400, 300)),
+        )
+        not_an_image = PostFactory.create(user=UserFactory.create())
+
+        out = StringIO()
+        call_command("generate_post_variants", stdout=out, stderr=StringIO())
+
+        image.refresh_from_db()
+        not_an_image.refresh_from_db()
+        self.assertEqual(image.media_status, "ready")
+        self.assertEqual(image.variants.count(), 3)
+        self.assertEqual(not_an_image.media_status, "original")
+        self.assertFalse(not_an_image.variants.exists())
+        self.assertIn(
+            "1 posts, 0 failed, 1 kept their original only", out.getvalue()
+        )
+
+
+class TestResumableUpload(APITestCase):
+    """
+    Tests below APIs
+    1. Upload session creation, chunks and finalization
+    2. Rejected chunks leave the session offset unchanged
+    3. Purge of expired sessions
+    4. Sessions claimed by a chunk in flight
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.upload_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.upload_root.cleanup)
+        overrides = override_settings(
+            UPLOAD_SESSION_ROOT=self.upload_root.name, POST_MEDIA_WORKERS=0
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.user = UserFactory.create()
+        application = ApplicationFactory.create()
+        access_token = AccessTokenFactory.create(
+            user=self.user, application=application
+        ).token
+        self.headers = {"Authorization": f"Bearer {access_token}"}
+
+    def start_upload(self, content):
+        response = self.client.post(
+            reverse("post-upload-list"),
+            {"filename": "../clip.mp4", "total_size": len(content)},
+            headers=self.headers,
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.json()["id"]
+
+    def put_chunk(self, session_id, offset, chunk, checksum=None):
+        checksum = checksum or hashlib.sha256(chunk).hexdigest()
+        return self.client.put(
+            reverse("post-upload-detail", kwargs={"pk": session_id}),
+            chunk,
+            content_type="application/offset+octet-stream",
+            headers={
+                **self.headers,
+                "Upload-Offset": str(offset),
+                "Upload-Checksum": f"sha256 {checksum}",
+            },
+        )
+
+    def test_resumable_upload(self):
+        content = os.urandom(3000)
+        session_id = self.start_upload(content)
+
+        response = self.put_chunk(session_id, 0, content[:1000])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["offset"], 1000)
+
+        response = self.client.get(
+            reverse("post-upload-detail", kwargs={"pk": session_id}),
+            headers=self.headers,
+        )
+        self.assertEqual(response.json()["offset"], 1000)
+        self.assertEqual(response.json()["filename"], "clip.mp4")
+
+        response = self.put_chunk(session_id, 1000, content[1000:])
+        self.assertEqual(response.json()["offset"], 3000)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("post-upload-finalize", kwargs={"pk": session_id}),
+                {"caption": "Resumed", "audience": "close_friends"},
+                headers=self.headers,
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        post = Post.objects.get(id=response.json()["id"])
+        self.assertEqual(post.user, self.user)
+        self.assertEqual(post.caption, "Resumed")
+        self.assertEqual(post.audience, "close_friends")
+        with post.file.open("rb") as uploaded:
+            self.assertEqual(uploaded.read(), content)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(self.upload_root.name), [])
+
+    def test_rejected_chunks(self):
+        content = os.urandom(2000)
+        session_id = self.start_upload(content)
+        self.put_chunk(session_id, 0, content[:1000])
+
+        response = self.put_chunk(session_id, 0, content[:1000])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.json()["offset"], 1000)
+
+        response = self.put_chunk(
+            session_id, 1000, content[1000:], checksum="0" * 64
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()["offset"], 1000)
+
+        response = self.put_chunk(session_id, 1000, content)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            reverse("post-upload-finalize", kwargs={"pk": session_id}),
+            headers=self.headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        # the failed chunks were cut off the partial file
+        self.put_chunk(session_id, 1000, content[1000:])
+        session = UploadSession.objects.get(id=session_id)
+        with open(session.path, "rb") as part:
+            self.assertEqual(part.read(), content)
+
+    def test_claimed_sessions(self):
+        content = os.urandom(2000)
+        session_id = self.start_upload(content)
+        session = UploadSession.objects.get(id=session_id)
+
+        # a chunk in flight holds the session without a lock
+        self.assertTrue(claim_session(session, 0))
+        response = self.put_chunk(session_id, 0, content[:1000])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.json()["offset"], 0)
+
+        # an abandoned claim expires
+        UploadSession.objects.filter(id=session_id).update(
+            claimed_until=timezone.now() - timedelta(seconds=1)
+        )
+        response = self.put_chunk(session_id, 0, content[:1000])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["offset"], 1000)
+
+        # a claim taken over mid-chunk keeps the offset of the new owner
+        session = UploadSession.objects.get(id=session_id)
+        self.assertTrue(claim_session(session, 1000))
+        UploadSession.objects.filter(id=session_id).update(
+            claimed_until=timezone.now() + timedelta(seconds=60)
+        )
+        self.assertFalse(advance_session(session, 1000))
+        self.assertEqual(UploadSession.objects.get(id=session_id).offset, 1000)
+
+    def test_purge_upload_sessions(self):
+        content = os.urandom(100)
+        session_id = self.start_upload(content)
+        self.put_chunk(session_id, 0, content[:50])
+        session = UploadSession.objects.get(id=session_id)
+        session.expires = timezone.now() - timedelta(seconds=1)
+        session.save()
+
+        response = self.put_chunk(session_id, 50, content[50:])
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        call_command("purge_upload_sessions", stdout=StringIO())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(session.path))
+
 
 class TestFeed(APITestCase):
     """
     Tests below APIs
     1. Feed API
+    2. Timeline fan-out on post and friendship changes
+    3. Bounded like and comment previews
+    4. Feed page loads with a fixed number of queries
+    5. Cached feed pages are invalidated by writes
+    6. Audience UNION query used to rebuild timelines
+    7. Feed pages assembled from cached post fragments
     """
 
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
     def test_feed_list_api(self):
         user1 = UserFactory.create(username="user1")
         user2 = UserFactory.create(username="user2")
@@ -136,12 +510,250 @@ class TestFeed(APITestCase):
         results = response_data.get("results", [])
         self.assertEqual(len(results), 1)
 
+    def test_feed_timeline_fan_out(self):
+        user1 = UserFactory.create(username="user1")
+        user2 = UserFactory.create(username="user2")
+        user3 = UserFactory.create(username="user3")
+
+        friendship = FriendFactory.create(user=user1, friend=user2)
+
+        friends_post = PostFactory.create(user=user2)
+        close_post = PostFactory.create(user=user2, audience="close_friends")
+        PostFactory.create(user=user3)
+
+        def timeline_post_ids():
+            return set(
+                TimelineEntry.objects.filter(viewer=user1).values_list(
+                    "post", flat=True
+                )
+            )
+
+        self.assertSetEqual(timeline_post_ids(), {friends_post.id})
+
+        # user2 marks user1 as close friend
+        FriendFactory.create(user=user2, friend=user1, is_close_friend=True)
+        self.assertSetEqual(
+            timeline_post_ids(), {friends_post.id, close_post.id}
+        )
+
+        # audience change is reflected in the timeline
+        close_post.audience = "friends"
+        close_post.save()
+        self.assertSetEqual(
+            timeline_post_ids(), {friends_post.id, close_post.id}
+        )
+
+        friendship.delete()
+        self.assertSetEqual(timeline_post_ids(), set())
+
+        # fan-out ignores a stale friend graph cached by this process
+        cache.set(f"close_friend_ids_{user2.id}", frozenset({user3.id}))
+        stale_post = PostFactory.create(user=user2, audience="close_friends")
+        self.assertFalse(
+            TimelineEntry.objects.filter(
+                viewer=user3, post=stale_post
+            ).exists()
+        )
+
+    def test_feed_fragment_cache(self):
+        user1 = UserFactory.create(username="user1")
+        user2 = UserFactory.create(username="user2")
+        FriendFactory.create(user=user1, friend=user2)
+        PostFactory.create_batch(3, user=user2)
+
+        application = ApplicationFactory.create()
+        access_token = AccessTokenFactory.create(
+            user=user1, application=application
+        ).token
+        headers = {"Authorization": f"Bearer {access_token}"}
+
+        url = reverse("feed-list")
+        cold_response = self.client.get(url, headers=headers)
+
+        # drop the cached pages but keep the post fragments
+        cache.delete(f"posts_feed_generation_{user1.id}")
+        with (
+            CaptureQueriesContext(connection) as context,
+            mock.patch.object(FeedSerializer, "to_representation") as render,
+        ):
+            warm_response = self.client.get(url, headers=headers)
+
+        render.assert_not_called()
+        self.assertEqual(len(cold_response.json()["results"]), 3)
+        self.assertFalse(
+            any(
+                '"posts_post"' in query["sql"]
+                for query in context.captured_queries
+            )
+        )
+        self.assertEqual(warm_response.json(), cold_response.json())
+
+    def test_rebuild_timeline(self):
+        viewer = UserFactory.create(username="viewer")
+        friend = UserFactory.create(username="friend")
+        close_friend = UserFactory.create(username="close_friend")
+        stranger = UserFactory.create(username="stranger")
+
+        FriendFactory.create(user=viewer, friend=friend)
+        FriendFactory.create(
+            user=close_friend, friend=viewer, is_close_friend=True
+        )
+        # friend has a close friend, but it is not the viewer
+        FriendFactory.create(
+            user=friend, friend=stranger, is_close_friend=True
+        )
+
+        visible_posts = [
+            PostFactory.create(user=friend),
+            PostFactory.create(user=close_friend, audience="close_friends"),
+        ]
+        PostFactory.create(user=friend, audience="close_friends")
+        PostFactory.create(user=close_friend)
+        PostFactory.create(user=stranger)
+
+        TimelineEntry.objects.all().delete()
+        rebuild_timeline(viewer.id)
+
+        self.assertSetEqual(
+            set(
+                TimelineEntry.objects.filter(viewer=viewer).values_list(
+                    "post", flat=True
+                )
+            ),
+            {post.id for post in visible_posts},
+        )
+
+    @override_settings(POST_PREVIEW_LIMIT=2)
+    def test_feed_previews_are_bounded(self):
+        user1 = UserFactory.create(username="user1")
+        user2 = UserFactory.create(username="user2")
+        FriendFactory.create(user=user1, friend=user2)
+
+        post = PostFactory.create(user=user2)
+        likers = UserFactory.create_batch(3)
+        for liker in likers:
+            PostLikeFactory.create(post=post, liked_by=liker)
+        PostCommentFactory.create_batch(
+            3, post=post, commented_by=user1, comment="Test Comment"
+        )
+
+        application = ApplicationFactory.create()
+        access_token = AccessTokenFactory.create(
+            user=user1, application=application
+        ).token
+
+        response = self.client.get(
+            reverse("feed-list"),
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+
+        feed_item = response.json()["results"][0]
+        self.assertListEqual(
+            [like["user_id"] for like in feed_item["likes"]],
+            [likers[2].id, likers[1].id],
+        )
+        self.assertEqual(len(feed_item["comments"]), 2)
+
+    def test_feed_query_count_is_constant(self):
+        user1 = UserFactory.create(username="user1")
+        user2 = UserFactory.create(username="user2")
+        FriendFactory.create(user=user1, friend=user2)
+
+        application = ApplicationFactory.create()
+        access_token = AccessTokenFactory.create(
+            user=user1, application=application
+        ).token
+        headers = {"Authorization": f"Bearer {access_token}"}
+
+        def feed_queries():
+            cache.clear()
+            token_cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(
+                    reverse("feed-list"), headers=headers
+                )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(context.captured_queries)
+
+        post = PostFactory.create(user=user2)
+        PostLikeFactory.create(post=post, liked_by=user1)
+        single_post_queries = feed_queries()
+
+        for post in PostFactory.create_batch(5, user=user2):
+            for liker in UserFactory.create_batch(2):
+                PostLikeFactory.create(post=post, liked_by=liker)
+                PostCommentFactory.create(
+                    post=post, commented_by=liker, comment="Test Comment"
+                )
+
+        self.assertEqual(feed_queries(), single_post_queries)
+
+    def test_feed_cache_invalidation(self):
+        user1 = UserFactory.create(username="user1")
+        user2 = UserFactory.create(username="user2")
+        FriendFactory.create(user=user1, friend=user2)
+        post = PostFactory.create(user=user2)
+
+        application = ApplicationFactory.create()
+        access_token = AccessTokenFactory.create(
+            user=user1, application=application
+        ).token
+        headers = {"Authorization": f"Bearer {access_token}"}
+
+        def first_feed_item():
+            response = self.client.get(reverse("feed-list"), headers=headers)
+            return response.json()["results"][0]
+
+        self.assertEqual(first_feed_item()["likes_count"], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("post-like"),
+                {"post": post.id, "action": "like"},
+                headers=headers,
+            )
+
+        self.assertEqual(first_feed_item()["likes_count"], 1)
+
+        # a like bumps the post version, not the feeds of its audience
+        user3 = UserFactory.create(username="user3")
+        FriendFactory.create(user=user3, friend=user2)
+        user4 = UserFactory.create(username="user4")
+        rebuild_timeline(user3.id)
+        generation = get_feed_generation(user3.id)
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                apply_likes({(post.id, user4.id): True})
+        self.assertEqual(get_feed_generation(user3.id), generation)
+        self.assertFalse(
+            any(
+                TimelineEntry._meta.db_table in query["sql"]
+                for query in context.captured_queries
+            )
+        )
+        self.assertEqual(first_feed_item()["likes_count"], 2)
+        self.assertTrue(first_feed_item()["liked_by_me"])
+
+        # pages are cached separately
+        second_post = PostFactory.create(user=user2)
+        cache.clear()
+        response = self.client.get(
+            reverse("feed-list"), {"page_size": 1}, headers=headers
+        )
+        self.assertEqual(response.json()["results"][0]["id"], second_post.id)
+        next_page = self.client.get(response.json()["next"], headers=headers)
+        self.assertEqual(next_page.json()["results"][0]["id"], post.id)
+
 
 class TestPostLikeUnlike(APITestCase):
     """
     Tests below APIs
     1. Post like
     2. Post unlike
+    3. Likes counter on like/unlike flips
+    4. Write-behind like buffer
+    5. Batch like and unlike
+    6. Paginated likers and liked_by_me in the feed
     """
 
     def test_post_like(self):
@@ -196,11 +808,216 @@ class TestPostLikeUnlike(APITestCase):
             ).exists()
         )
 
+    def test_post_likes_count(self):
+        user1 = UserFactory.create(username="user1")
+        user2 = UserFactory.create(username="user2")
+
+        FriendFactory.create(user=user1, friend=user2)
+
+        application = ApplicationFactory.create()
+        access_token = AccessTokenFactory.create(
+            user=user1, application=application
+        ).token
+        headers = {"Authorization": f"Bearer {access_token}"}
+
+        post = PostFactory.create(user=user2)
+        url = reverse("post-like")
+
+        expected_counts = [("like", 1), ("like", 1), ("unlike", 0)]
+        for action, expected_count in expected_counts:
+            self.client.post(
+                url, {"post": post.id, "action": action}, headers=headers
+            )
+            post.refresh_from_db()
+            self.assertEqual(post.likes_count, expected_count)
+
+    @override_settings(POST_LIKE_WRITE_BEHIND=True, POST_LIKE_FLUSH_INTERVAL=0)
+    def test_post_like_write_behind(self):
+        user1 = UserFactory.create(username="user1")
+        user2 = UserFactory.create(username="user2")
+
+        FriendFactory.create(user=user1, friend=user2)
+
+        application = ApplicationFactory.create()
+        access_token = AccessTokenFactory.create(
+            user=user1, application=application
+        ).token
+        headers = {"Authorization": f"Bearer {access_token}"}
+
+        post = PostFactory.create(user=user2)
+        url = reverse("post-like")
+
+        cache.clear()
+
+        def feed_item():
+            response = self.client.get(reverse("feed-list"), headers=headers)
+            return response.json()["results"][0]
+
+        self.assertEqual(feed_item()["likes_count"], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for action in ["like", "unlike", "like"]:
+                self.client.post(
+                    url, {"post": post.id, "action": action}, headers=headers
+                )
+
+        self.assertFalse(PostLike.objects.filter(post=post).exists())
+        self.assertEqual(like_buffer.get_pending_delta(post.id), 1)
+
+        # the cached fragment picks up the pending delta before the flush
+        item = feed_item()
+        self.assertEqual(item["likes_count"], 1)
+        self.assertTrue(item["liked_by_me"])
+
+        like_buffer.flush()
+
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 1)
+        self.assertEqual(like_buffer.get_pending_delta(post.id), 0)
+        self.assertTrue(
+            PostLike.objects.filter(
+                post=post, liked_by=user1, is_liked=True
+            ).exists()
+        )
+
+    @override_settings(POST_LIKE_WRITE_BEHIND=True, POST_LIKE_FLUSH_INTERVAL=0)
+    def test_post_like_write_behind_failures(self):
+        user1 = UserFactory.create(username="user1")
+        user2 = UserFactory.create(username="user2")
+        deleted_post, post = PostFactory.create_batch(2, user=user2)
+
+        like_buffer.record(deleted_post.id, user1.id, True)
+        like_buffer.record(post.id, user1.id, True)
+        deleted_post.delete()
+        like_buffer.flush()
+
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 1)
+        self.assertIsNone(
+            like_buffer.get_pending_state(deleted_post.id, user1.id)
+        )
+
+        # states that keep failing are dropped after the retries
+        like_buffer.record(post.id, user1.id, False)
+        retries = settings.POST_LIKE_FLUSH_RETRIES
+        with (
+            mock.patch("apps.posts.likes.apply_likes", side_effect=ValueError),
+            self.assertLogs("apps.posts.likes", "ERROR") as logs,
+        ):
+            for _ in range(retries):
+                like_buffer.flush()
+                self.assertIs(
+                    like_buffer.get_pending_state(post.id, user1.id), False
+                )
+                self.assertEqual(like_buffer.get_pending_delta(post.id), -1)
+            like_buffer.flush()
+        self.assertIsNone(like_buffer.get_pending_state(post.id, user1.id))
+        self.assertEqual(like_buffer.get_pending_delta(post.id), 0)
+
+        messages = [record.getMessage() for record in logs.records]
+        self.assertEqual(
+            messages,
+            ["Failed to flush 1 buffered likes"] * (retries + 1)
+            + ["Dropped 1 buffered likes after retries"],
+        )
+
+    def test_post_like_batch(self):
+        cache.clear()
+        user1 = UserFactory.create(username="user1")
+        user2 = UserFactory.create(username="user2")
+        user3 = UserFactory.create(username="user3")
+
+        FriendFactory.create(user=user1, friend=user2)
+
+        application = ApplicationFactory.create()
+        access_token = AccessTokenFactory.create(
+            user=user1, application=application
+        ).token
+        headers = {"Authorization": f"Bearer {access_token}"}
+
+        liked_post, unliked_post = PostFactory.create_batch(2, user=user2)
+        PostLikeFactory.create(post=unliked_post, liked_by=user1)
+        Post.objects.filter(id=unliked_post.id).update(likes_count=1)
+        stranger_post = PostFactory.create(user=user3)
+
+        url = reverse("post-like-batch")
+        data = {
+            "likes": [
+                {"post": liked_post.id, "action": "like"},
+                {"post": unliked_post.id, "action": "unlike"},
+            ]
+        }
+        response = self.client.post(url, data, headers=headers, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        liked_post.refresh_from_db()
+        unliked_post.refresh_from_db()
+        self.assertEqual(liked_post.likes_count, 1)
+        self.assertEqual(unliked_post.likes_count, 0)
+        self.assertTrue(
+            PostLike.objects.filter(
+                post=unliked_post, liked_by=user1, is_liked=False
+            ).exists()
+        )
+
+        data["likes"].append({"post": stranger_post.id, "action": "like"})
+        response = self.client.post(url, data, headers=headers, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        data["likes"][-1]["post"] = 0
+        response = self.client.post(url, data, headers=headers, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_post_likers_and_liked_by_me(self):
+        cache.clear()
+        user1 = UserFactory.create(username="user1")
+        user2 = UserFactory.create(username="user2")
+
+        FriendFactory.create(user=user1, friend=user2)
+
+        liked_post, other_post = PostFactory.create_batch(2, user=user2)
+        likers = UserFactory.create_batch(2)
+        for liker in [*likers, user1]:
+            PostLikeFactory.create(post=liked_post, liked_by=liker)
+
+        application = ApplicationFactory.create()
+        access_token = AccessTokenFactory.create(
+            user=user1, application=application
+        ).token
+        headers = {"Authorization": f"Bearer {access_token}"}
+
+        url = reverse("post-likes", kwargs={"pk": liked_post.id})
+        response = self.client.get(url, {"page_size": 2}, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first_page = response.json()
+        self.assertListEqual(
+            [like["user_id"] for like in first_page["results"]],
+            [user1.id, likers[1].id],
+        )
+        second_page = self.client.get(
+            first_page["next"], headers=headers
+        ).json()
+        self.assertListEqual(
+            [like["user_id"] for like in second_page["results"]],
+            [likers[0].id],
+        )
+
+        response = self.client.get(reverse("feed-list"), headers=headers)
+        liked_by_me = {
+            item["id"]: item["liked_by_me"]
+            for item in response.json()["results"]
+        }
+        self.assertDictEqual(
+            liked_by_me, {liked_post.id: True, other_post.id: False}
+        )
+
 
 class TestPostComment(APITestCase):
     """
     Tests below APis
     1. Post comment
+    2. Counter recomputation command
+    3. Paginated comment list
     """
 
     def test_post_comment(self):
@@ -229,3 +1046,70 @@ class TestPostComment(APITestCase):
                 post=post, commented_by=user1, comment=comment_text
             ).exists()
         )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_recount_post_counters(self):
+        user1 = UserFactory.create(username="user1")
+        user2 = UserFactory.create(username="user2")
+        post = PostFactory.create(user=user2)
+
+        PostLikeFactory.create(post=post, liked_by=user1)
+        PostLikeFactory.create(post=post, liked_by=user2, is_liked=False)
+        PostCommentFactory.create_batch(
+            2, post=post, commented_by=user1, comment="Test Comment"
+        )
+
+        call_command("recount_post_counters", stdout=StringIO())
+
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 1)
+        self.assertEqual(post.comments_count, 2)
+
+    def test_post_comment_list(self):
+        cache.clear()
+        user1 = UserFactory.create(username="user1")
+        user2 = UserFactory.create(username="user2")
+        user3 = UserFactory.create(username="user3")
+
+        FriendFactory.create(user=user1, friend=user2)
+
+        post = PostFactory.create(user=user2)
+        comments = [
+            PostCommentFactory.create(
+                post=post, commented_by=user1, comment=f"Comment {i}"
+            )
+            for i in range(3)
+        ]
+
+        application = ApplicationFactory.create()
+        url = reverse("post-comments", kwargs={"pk": post.id})
+
+        def get_comments(user, *args):
+            access_token = AccessTokenFactory.create(
+                user=user, application=application
+            ).token
+            return self.client.get(
+                *args or [url, {"page_size": 2}],
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+
+        response = get_comments(user1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first_page = response.json()
+        self.assertListEqual(
+            [c["comment"] for c in first_page["results"]],
+            [comments[2].comment, comments[1].comment],
+        )
+
+        second_page = get_comments(user1, first_page["next"]).json()
+        self.assertListEqual(
+            [c["comment"] for c in second_page["results"]],
+            [comments[0].comment],
+        )
+
+        # post owner can read, other users cannot
+        self.assertEqual(get_comments(user2).status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            get_comments(user3).status_code, status.HTTP_403_FORBIDDEN
+        )
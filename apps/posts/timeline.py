@@ -0,0 +1,109 @@
+from apps.friends.models import Friend
+from apps.posts.models import Post, TimelineEntry
+
+BATCH_SIZE = 1000
+
+
+def get_audience_ids(post):
+    """
+    Ids of the users who are allowed to see the post in their feed.
+
+    Timeline rows outlive any cache, so the audience is read from the
+    database rather than the cached friend graph.
+    """
+    if post.audience == "close_friends":
+        friends = Friend.objects.filter(
+            user=post.user_id, is_close_friend=True
+        )
+        return friends.values_list("friend", flat=True)
+    return Friend.objects.filter(friend=post.user_id).values_list(
+        "user", flat=True
+    )
+
+
+def get_visible_posts(viewer_id):
+    """
+    Posts the viewer is allowed to see, built as a UNION ALL of one query
+    per audience so each branch can be driven by its own index. The
+    branches filter on different audiences and never overlap.
+    """
+    friends_posts = Post.objects.filter(
+        audience="friends",
+        user__in=Friend.objects.filter(user=viewer_id).values("friend"),
+    )
+    close_friends_posts = Post.objects.filter(
+        audience="close_friends",
+        user__in=Friend.objects.filter(
+            friend=viewer_id, is_close_friend=True
+        ).values("user"),
+    )
+    return friends_posts.union(close_friends_posts, all=True)
+
+
+def fan_out_post(post):
+    """
+    Writes the post into the timeline of every user in its audience,
+    replacing whatever rows existed for the post before.
+
+    Returns the ids of the viewers who had or now have the post.
+    """
+    entries = TimelineEntry.objects.filter(post=post)
+    previous_viewer_ids = set(entries.values_list("viewer", flat=True))
+    entries.delete()
+
+    viewer_ids = set(get_audience_ids(post))
+    entries = [
+        TimelineEntry(
+            viewer_id=viewer_id, post=post, post_updated=post.updated
+        )
+        for viewer_id in viewer_ids
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+    return previous_viewer_ids | viewer_ids
+
+
+def sync_timeline(viewer_id, author_id):
+    """
+    Repairs the timeline of viewer for the posts of author after the
+    friendship between both users has changed
+    """
+    TimelineEntry.objects.filter(
+        viewer=viewer_id, post__user=author_id
+    ).delete()
+
+    audiences = []
+    if Friend.objects.filter(user=viewer_id, friend=author_id).exists():
+        audiences.append("friends")
+    if Friend.objects.filter(
+        user=author_id, friend=viewer_id, is_close_friend=True
+    ).exists():
+        audiences.append("close_friends")
+
+    if not audiences:
+        return
+
+    posts = Post.objects.filter(
+        user=author_id, audience__in=audiences
+    ).values_list("id", "updated")
+    entries = [
+        TimelineEntry(
+            viewer_id=viewer_id, post_id=post_id, post_updated=updated
+        )
+        for post_id, updated in posts.iterator()
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+def rebuild_timeline(viewer_id):
+    """
+    Rebuilds the whole timeline of viewer from the friend graph
+    """
+    TimelineEntry.objects.filter(viewer=viewer_id).delete()
+    posts = get_visible_posts(viewer_id).values_list("id", "updated")
+    entries = [
+        TimelineEntry(
+            viewer_id=viewer_id, post_id=post_id, post_updated=updated
+        )
+        for post_id, updated in posts
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
@@ -0,0 +1,180 @@
+import hashlib
+import os
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework.parsers import BaseParser
+
+from apps.common.media import queue_release
+from apps.posts.media import enqueue_variants
+from apps.posts.models import Post, UploadSession
+
+READ_SIZE = 64 * 1024
+
+
+class ChunkError(Exception):
+    """
+    Raised when a chunk could not be appended, the session file is left
+    at the session offset so the client can retry the same chunk
+    """
+
+
+class ChunkParser(BaseParser):
+    """
+    Accepts upload chunks without reading them, the body is streamed to
+    disk by `append_chunk` instead of being parsed into request.data
+    """
+
+    media_type = "application/offset+octet-stream"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return {}
+
+
+def get_upload_expiry():
+    return timezone.now() + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+
+
+def parse_checksum(header):
+    """
+    Hex digest out of an `Upload-Checksum: sha256 <hex digest>` header
+    """
+    algorithm, _, digest = (header or "").partition(" ")
+    digest = digest.strip().lower()
+    if algorithm.lower() != "sha256" or len(digest) != 64:
+        raise ChunkError("Upload-Checksum must be 'sha256 <hex digest>'")
+    return digest
+
+
+def claim_session(session, offset):
+    """
+    Claims the session at `offset` for one chunk or the finalization with
+    a single conditional UPDATE, so no transaction or row lock is held
+    while the body is transferred. Returns False when the session moved
+    past `offset` or another request holds an unexpired claim.
+    """
+    now = timezone.now()
+    claimed_until = now + timedelta(seconds=settings.UPLOAD_CLAIM_TIMEOUT)
+    claimed = (
+        UploadSession.objects.filter(pk=session.pk, offset=offset)
+        .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now))
+        .update(claimed_until=claimed_until)
+    )
+    if claimed:
+        session.claimed_until = claimed_until
+    return bool(claimed)
+
+
+def release_session(session):
+    """
+    Gives up the claim of `session` if it still holds it
+    """
+    if session.claimed_until is None:
+        return
+    UploadSession.objects.filter(
+        pk=session.pk, claimed_until=session.claimed_until
+    ).update(claimed_until=None)
+    session.claimed_until = None
+
+
+def advance_session(session, length):
+    """
+    Moves a claimed session past an appended chunk and releases it,
+    returns False when the claim expired and was taken over meanwhile
+    """
+    now = timezone.now()
+    expires = get_upload_expiry()
+    advanced = UploadSession.objects.filter(
+        pk=session.pk,
+        offset=session.offset,
+        claimed_until=session.claimed_until,
+    ).update(
+        offset=F("offset") + length,
+        expires=expires,
+        claimed_until=None,
+        updated=now,
+    )
+    if advanced:
+        session.offset += length
+        session.expires = expires
+        session.updated = now
+        session.claimed_until = None
+    return bool(advanced)
+
+
+def append_chunk(session, stream, length, checksum):
+    """
+    Appends `length` bytes read from `stream` to the session file in fixed
+    size reads, so a chunk is never held in memory as a whole.
+
+    The file is cut back to the session offset when the body ends early
+    or its sha256 does not match `checksum`.
+    """
+    os.makedirs(settings.UPLOAD_SESSION_ROOT, exist_ok=True)
+    digest = hashlib.sha256()
+    remaining = length
+
+    with open(session.path, "ab") as part:
+        if part.seek(0, os.SEEK_END) < session.offset:
+            raise ChunkError("Uploaded data is missing, start a new upload")
+        # drops whatever an earlier failed chunk left behind
+        part.truncate(session.offset)
+
+        try:
+            while remaining:
+                block = stream.read(min(READ_SIZE, remaining))
+                if not block:
+                    break
+                digest.update(block)
+                part.write(block)
+                remaining -= len(block)
+        except OSError:
+            remaining = length
+
+        if remaining:
+            part.truncate(session.offset)
+            raise ChunkError("Chunk body is shorter than Content-Length")
+        if digest.hexdigest() != checksum:
+            part.truncate(session.offset)
+            raise ChunkError("Chunk does not match Upload-Checksum")
+
+        part.flush()
+        os.fsync(part.fileno())
+
+
+def finalize_upload(session, **fields):
+    """
+    Creates the Post of a claimed, complete upload. The file is copied to
+    storage before the transaction starts, which only creates the post
+    and deletes the session if the claim is still held. The session file
+    is gone once the post is committed.
+    """
+    path = session.path
+    post = Post(user_id=session.user_id, **fields)
+    with open(path, "rb") as part:
+        post.file.save(session.filename, File(part), save=False)
+
+    with transaction.atomic():
+        deleted, _ = UploadSession.objects.filter(
+            pk=session.pk, claimed_until=session.claimed_until
+        ).delete()
+        if not deleted:
+            queue_release(post.file.name)
+            raise ChunkError("Upload session changed while finalizing")
+        post.save()
+        enqueue_variants(post)
+        transaction.on_commit(partial(remove_part, path))
+    session.claimed_until = None
+    return post
+
+
+def remove_part(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -11,8 +11,17 @@ router.register(
     "post/comment", views.PostCommentViewSet, basename="post-comment"
 )
 
+router.register(
+    "post/uploads", views.UploadSessionViewSet, basename="post-upload"
+)
+
 urlpatterns = router.urls
 
 urlpatterns += [
-    path("post/like", views.PostLikeAPIView.as_view(), name="post-like")
+    path("post/like", views.PostLikeAPIView.as_view(), name="post-like"),
+    path(
+        "post/like/batch",
+        views.PostLikeBatchAPIView.as_view(),
+        name="post-like-batch",
+    ),
 ]
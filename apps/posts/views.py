@@ -4,17 +4,43 @@ from rest_framework import views
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.parsers import FileUploadParser
+from rest_framework.settings import api_settings
 from rest_framework.response import Response
 from rest_framework import mixins
+from rest_framework.renderers import JSONRenderer
 
-from django.db.models import Q, Subquery
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 from django.core.cache import cache
+from django.http import Http404, HttpResponse
 
-from apps.common.pagination import StandardResultsSetPagination
-from apps.friends.models import Friend
-from apps.common.utils import set_json_renderer
-from apps.posts.permissions import MustBeFriendPermission
+from apps.common.pagination import KeysetPagination
+from apps.posts.permissions import (
+    MustBeFriendPermission,
+    PostViewerPermission,
+)
 from apps.posts.forms import PostLikeForm
+from apps.posts.likes import apply_likes, get_liked_post_ids, like_buffer
+from apps.posts.media import enqueue_variants
+from apps.posts.uploads import (
+    ChunkError,
+    ChunkParser,
+    advance_session,
+    append_chunk,
+    claim_session,
+    finalize_upload,
+    get_upload_expiry,
+    parse_checksum,
+    release_session,
+    remove_part,
+)
+from apps.posts.feed_cache import (
+    get_feed_cache_key,
+    get_post_fragments,
+    invalidate_post_fragments,
+)
 
 from apps.posts.serializers import (
     FeedSerializer,
@@ -23,8 +49,12 @@ from apps.posts.serializers import (
     PostCreateSerializer,
     PostUpdateSerializer,
     PostCommentCreateSerializer,
+    PostCommentSerializer,
+    PostLikeBatchSerializer,
+    PostLikeSerializer,
+    UploadSessionSerializer,
 )
-from apps.posts.models import Post, PostLike
+from apps.posts.models import Post, TimelineEntry, UploadSession
 
 
 class PostViewSet(viewsets.ModelViewSet):
@@ -32,15 +62,23 @@ class PostViewSet(viewsets.ModelViewSet):
 
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_ordering = ("-created", "-id")
 
     def get_queryset(self):
         if self.request.user.is_anonymous:
             return []
-        return (
+        if self.action in ("comments", "likes"):
+            # object permissions decide who may read another user's post
+            return Post.objects.all()
+        posts = (
             Post.objects.filter(user=self.request.user)
             .select_related("user", "user__profile")
             .order_by("-created")
         )
+        if self.action == "retrieve":
+            posts = posts.with_previews()
+        return posts.with_variants()
 
     def get_serializer_class(self):
         if self.action == "upload_file":
@@ -63,7 +101,11 @@ class PostViewSet(viewsets.ModelViewSet):
 
         new_post = Post(user=user)
         new_post.file = file
-        new_post.save()
+        with transaction.atomic():
+            new_post.save()
+            # renditions are rendered by the worker pool after commit, the
+            # response only carries the pending media status
+            enqueue_variants(new_post)
 
         serializer_class = self.get_serializer_class()
         serializer = serializer_class(instance=new_post)
@@ -72,46 +114,112 @@ class PostViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
+    @action(
+        detail=True,
+        methods=["GET"],
+        permission_classes=[IsAuthenticated, PostViewerPermission],
+        cursor_ordering=("-created", "-id"),
+    )
+    def comments(self, request, pk=None):
+        post = self.get_object()
+        comments = post.comments.select_related("commented_by__profile")
+
+        page = self.paginate_queryset(comments)
+        serializer = PostCommentSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=True,
+        methods=["GET"],
+        permission_classes=[IsAuthenticated, PostViewerPermission],
+        cursor_ordering=("-updated", "-id"),
+    )
+    def likes(self, request, pk=None):
+        post = self.get_object()
+        likes = post.likes.filter(is_liked=True).select_related(
+            "liked_by__profile"
+        )
+
+        page = self.paginate_queryset(likes)
+        serializer = PostLikeSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
 class FeedViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     serializer_class = FeedSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = KeysetPagination
+    cursor_ordering = ("-post_updated", "-post_id")
 
     def get_queryset(self):
-        user = self.request.user
-        posts = (
-            Post.objects.filter(
-                Q(
-                    audience="friends",
-                    user__in=Subquery(
-                        Friend.objects.filter(user=user).values_list(
-                            "friend", flat=True
-                        )
-                    ),
-                )
-                | Q(
-                    audience="close_friends",
-                    user__friends__is_close_friend=True,
-                )
-            )
-            .select_related("user", "user__profile")
-            .order_by("-updated")
-            .distinct()
+        # timeline rows are written on post and friendship changes, so the
+        # page is a range scan over the viewer's own entries
+        return TimelineEntry.objects.filter(viewer=self.request.user).only(
+            "post_id", "post_updated"
         )
-        return posts
 
     def list(self, request, *args, **kwargs):
-        cache_key = f"{request.user.id}_posts_feed"
-        response = cache.get(cache_key)
+        # the cached page only holds ids, post content is read from the
+        # fragments at render time so likes and comments bump one version
+        cache_key = get_feed_cache_key(request)
+        page = cache.get(cache_key)
 
-        if response is not None:
-            return response
+        if page is None:
+            entries = self.paginate_queryset(self.get_queryset())
+            post_ids = [entry.post_id for entry in entries]
+            page = {
+                "next": self.paginator.get_next_link(),
+                "previous": self.paginator.get_previous_link(),
+                "post_ids": post_ids,
+                "liked_post_ids": get_liked_post_ids(
+                    request.user.id, post_ids
+                ),
+            }
+            cache.set(cache_key, page, settings.FEED_CACHE_TIMEOUT)
 
-        response = super().list(request, *args, **kwargs)
-        response = set_json_renderer(response)
-        cache.set(cache_key, response.render(), 60 * 3)
-        return response
+        fragments = get_post_fragments(page["post_ids"], self.render_posts)
+        content = self.render_page(
+            page,
+            [
+                self.add_viewer_fields(
+                    fragment,
+                    liked_by_me=post_id in page["liked_post_ids"],
+                )
+                for post_id, fragment in fragments.items()
+            ],
+        )
+        return HttpResponse(content, content_type="application/json")
+
+    def render_posts(self, post_ids):
+        """
+        Serializes posts missing from the fragment cache
+        """
+        posts = (
+            Post.objects.filter(id__in=post_ids)
+            .select_related("user", "user__profile")
+            .with_previews()
+            .with_variants()
+        )
+        serializer = self.get_serializer(posts, many=True)
+        renderer = JSONRenderer()
+        return {item["id"]: renderer.render(item) for item in serializer.data}
+
+    def add_viewer_fields(self, fragment, liked_by_me):
+        """
+        Appends the fields that differ per viewer to a shared fragment
+        """
+        liked_by_me = b"true" if liked_by_me else b"false"
+        return fragment[:-1] + b',"liked_by_me":' + liked_by_me + b"}"
+
+    def render_page(self, page, fragments):
+        """
+        Joins cached post fragments into the paginated response body
+        """
+        links = JSONRenderer().render(
+            {"next": page["next"], "previous": page["previous"]}
+        )
+        results = b"[" + b",".join(fragments) + b"]"
+        return links[:-1] + b',"results":' + results + b"}"
 
 
 # class PostLikeViewSet(viewsets.GenericViewSet, mixins.CreateModelMixin):
@@ -142,21 +250,62 @@ class PostLikeAPIView(views.APIView):
             post = form.cleaned_data.get("post")
             self.check_object_permissions(request, post)
 
-            action = form.cleaned_data.get("action")
-            post_like, _ = PostLike.objects.get_or_create(
-                liked_by=request.user, post=post
-            )
-
-            if action == "like":
-                post_like.is_liked = True
+            is_liked = form.cleaned_data.get("action") == "like"
+            if settings.POST_LIKE_WRITE_BEHIND:
+                like_buffer.record(post.id, request.user.id, is_liked)
             else:
-                post_like.is_liked = False
-            post_like.save()
+                apply_likes({(post.id, request.user.id): is_liked})
             return Response({"success": True}, status=status.HTTP_200_OK)
         else:
             return Response(form.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class PostLikeBatchAPIView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = PostLikeBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # the last action on a post wins
+        actions = {
+            like["post"]: like["action"] == "like"
+            for like in serializer.validated_data["likes"]
+        }
+        posts = Post.objects.filter(id__in=actions).only(
+            "id", "user_id", "audience"
+        )
+
+        missing_ids = set(actions) - {post.id for post in posts}
+        if missing_ids:
+            return Response(
+                {"post": [f"Post does not exist: {sorted(missing_ids)}"]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # friend sets are cached, so this is set membership per post
+        permission = MustBeFriendPermission()
+        for post in posts:
+            if not permission.has_object_permission(request, self, post):
+                self.permission_denied(request)
+
+        user_id = request.user.id
+        if settings.POST_LIKE_WRITE_BEHIND:
+            for post_id, is_liked in actions.items():
+                like_buffer.record(post_id, user_id, is_liked)
+        else:
+            apply_likes(
+                {
+                    (post_id, user_id): is_liked
+                    for post_id, is_liked in actions.items()
+                }
+            )
+        return Response({"success": True}, status=status.HTTP_200_OK)
+
+
 class PostCommentViewSet(viewsets.GenericViewSet, mixins.CreateModelMixin):
     serializer_class = PostCommentCreateSerializer
     permission_classes = [IsAuthenticated, MustBeFriendPermission]
@@ -171,9 +320,139 @@ class PostCommentViewSet(viewsets.GenericViewSet, mixins.CreateModelMixin):
         if serializer.is_valid():
             post = serializer.validated_data["post"]
             self.check_object_permissions(request, post)
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                Post.objects.filter(pk=post.pk).update(
+                    comments_count=F("comments_count") + 1
+                )
+                invalidate_post_fragments([post.pk])
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
             return Response(
                 serializer.errors, status=status.HTTP_400_BAD_REQUEST
             )
+
+
+class UploadSessionViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Resumable post uploads
+
+    Create a session with the file name and size, PUT the bytes in order
+    with `Upload-Offset` and `Upload-Checksum: sha256 <hex>` headers,
+    GET the session to learn where to resume, then finalize it into a post
+    """
+
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, ChunkParser]
+
+    def get_queryset(self):
+        if self.request.user.is_anonymous:
+            return UploadSession.objects.none()
+        return UploadSession.objects.filter(
+            user=self.request.user, expires__gt=timezone.now()
+        )
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user, expires=get_upload_expiry())
+
+    def perform_destroy(self, instance):
+        path = instance.path
+        instance.delete()
+        remove_part(path)
+
+    def update(self, request, *args, **kwargs):
+        """
+        Appends a chunk of the file at the offset the session is at, the
+        session is claimed rather than locked while the body streams in
+        """
+        session = self.get_object()
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            length = int(request.headers["Content-Length"])
+            checksum = parse_checksum(request.headers.get("Upload-Checksum"))
+        except (KeyError, ValueError):
+            return self.chunk_error(
+                session, "Upload-Offset and Content-Length are required"
+            )
+        except ChunkError as error:
+            return self.chunk_error(session, str(error))
+
+        if offset != session.offset:
+            return self.chunk_error(
+                session,
+                "Upload-Offset does not match the session offset",
+                status.HTTP_409_CONFLICT,
+            )
+        if not 0 < length <= settings.UPLOAD_CHUNK_MAX_SIZE:
+            return self.chunk_error(
+                session,
+                f"Chunks must be between 1 and "
+                f"{settings.UPLOAD_CHUNK_MAX_SIZE} bytes",
+            )
+        if offset + length > session.total_size:
+            return self.chunk_error(session, "Chunk exceeds the file size")
+
+        if not claim_session(session, offset):
+            return self.claim_error(session)
+        try:
+            append_chunk(session, request.stream, length, checksum)
+            advanced = advance_session(session, length)
+        except ChunkError as error:
+            return self.chunk_error(session, str(error))
+        finally:
+            release_session(session)
+
+        if not advanced:
+            return self.claim_error(session)
+        serializer = self.get_serializer(session)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def chunk_error(self, session, detail, code=status.HTTP_400_BAD_REQUEST):
+        return Response({"detail": detail, "offset": session.offset}, code)
+
+    def claim_error(self, session):
+        try:
+            session.refresh_from_db(fields=["offset"])
+        except UploadSession.DoesNotExist:
+            raise Http404
+        return self.chunk_error(
+            session,
+            "Another request is writing this upload or its offset moved",
+            status.HTTP_409_CONFLICT,
+        )
+
+    @action(detail=True, methods=["POST"])
+    def finalize(self, request, pk=None):
+        """
+        Creates the post out of a complete upload, with optional metadata
+        """
+        session = self.get_object()
+        if session.offset != session.total_size:
+            return self.chunk_error(
+                session, "Upload is incomplete", status.HTTP_409_CONFLICT
+            )
+
+        serializer = PostUpdateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not claim_session(session, session.total_size):
+            return self.claim_error(session)
+        try:
+            post = finalize_upload(session, **serializer.validated_data)
+        except ChunkError as error:
+            return self.chunk_error(
+                session, str(error), status.HTTP_409_CONFLICT
+            )
+        finally:
+            release_session(session)
+        serializer = PostCreateSerializer(instance=post)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
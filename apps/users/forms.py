@@ -7,6 +7,27 @@ from apps.users.models import UserProfile
 
 User = get_user_model()
 
+EMAIL_CONSTRAINTS = ("user_email_ci_unique",)
+# sqlite names the column, postgresql the implicit unique constraint
+USERNAME_CONSTRAINTS = ("auth_user.username", "auth_user_username_key")
+
+
+def get_conflicting_field(error):
+    """
+    Field of the unique index an IntegrityError on auth_user violated, or
+    None for any other error. Only the constraint name is looked at, the
+    rest of the message can quote the conflicting values.
+    """
+    diag = getattr(error.__cause__, "diag", None)
+    constraint = getattr(diag, "constraint_name", None)
+    if constraint is None:
+        constraint = str(error).partition("\n")[0]
+    if any(name in constraint for name in EMAIL_CONSTRAINTS):
+        return "email"
+    if any(name in constraint for name in USERNAME_CONSTRAINTS):
+        return "username"
+    return None
+
 
 class UserCreationForm(forms.ModelForm):
     """
@@ -20,21 +41,21 @@ class UserCreationForm(forms.ModelForm):
         model = User
         fields = ["username", "email", "password"]
 
-    def clean_username(self):
-        username = self.cleaned_data["username"]
-        if User.objects.filter(username=username).exists():
-            raise forms.ValidationError(
-                "User with provided username already exists!"
-            )
-        return username
-
-    def clean_email(self):
-        email = self.cleaned_data["email"]
-        if User.objects.filter(email=email).exists():
-            raise forms.ValidationError(
-                "User with provided email already exists!"
-            )
-        return email
+    def validate_unique(self):
+        # uniqueness is left to the username key and the case insensitive
+        # email index, checking first would only race concurrent signups
+        pass
+
+    def add_integrity_error(self, error):
+        """
+        Maps a unique violation raised on save to the field it belongs to,
+        returns False for errors of any other constraint
+        """
+        field = get_conflicting_field(error)
+        if field is None:
+            return False
+        self.add_error(field, f"User with provided {field} already exists!")
+        return True
 
 
 class UserProfileCreationForm(forms.ModelForm):
@@ -0,0 +1,230 @@
+import csv
+import json
+import re
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from apps.common.passwords import hash_passwords
+from apps.users.models import UserProfile
+
+User = get_user_model()
+
+FORMATS = ("csv", "jsonl")
+PROFILE_FIELDS = ("name", "mobile_number", "date_of_birth", "bio")
+MOBILE_NUMBER_RE = re.compile("[6-9][0-9]{9}")
+ACCOUNT_TYPES = {choice for choice, _ in UserProfile.ACCOUNT_TYPE_CHOICES}
+
+
+def get_format(filename):
+    extension = filename.rsplit(".", 1)[-1].lower()
+    return {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl"}.get(extension)
+
+
+def iter_records(lines, file_format):
+    """
+    Yields (line number, record or None, error) for every user in an
+    iterable of text lines, reading one line at a time
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, None, "Invalid JSON"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "Expected a JSON object"
+            continue
+        yield line_number, record, None
+
+
+def clean_record(record):
+    """
+    User and profile fields of a record, raises ValidationError with the
+    reason it cannot be imported
+    """
+    username = str(record.get("username") or "").strip()
+    email = str(record.get("email") or "").strip()
+    password = record.get("password") or ""
+    password_hash = record.get("password_hash") or ""
+
+    if not username:
+        raise ValidationError("Username is required")
+    User.username_validator(username)
+    if len(username) > User._meta.get_field("username").max_length:
+        raise ValidationError("Username is too long")
+    if not email:
+        raise ValidationError("Email is required")
+    validate_email(email)
+    if not password and not password_hash:
+        raise ValidationError("A password or password_hash is required")
+
+    user = {
+        "username": username,
+        "email": email,
+        "first_name": str(record.get("first_name") or "")[:150],
+        "last_name": str(record.get("last_name") or "")[:150],
+        "password": password_hash,
+        "raw_password": None if password_hash else str(password),
+    }
+
+    if not any(record.get(field) for field in PROFILE_FIELDS):
+        return user, None
+
+    mobile_number = str(record.get("mobile_number") or "")
+    if not MOBILE_NUMBER_RE.fullmatch(mobile_number):
+        raise ValidationError("Please enter 10 digit mobile number!")
+    if not record.get("name"):
+        raise ValidationError("Profile name is required")
+    try:
+        date_of_birth = date.fromisoformat(str(record.get("date_of_birth")))
+    except ValueError:
+        raise ValidationError("date_of_birth must be YYYY-MM-DD")
+    account_type = record.get("account_type") or "public"
+    if account_type not in ACCOUNT_TYPES:
+        raise ValidationError(f"Unknown account_type {account_type}")
+
+    profile = {
+        "name": str(record["name"])[:100],
+        "mobile_number": mobile_number,
+        "date_of_birth": date_of_birth,
+        "bio": record.get("bio") or None,
+        "account_type": account_type,
+    }
+    return user, profile
+
+
+class UserImporter:
+    """
+    Imports users and their profiles in bulk_create batches.
+
+    Only one batch is held in memory. Every row that is not imported is
+    passed to `report(line number, username, reason)`, whether it is
+    invalid, repeats an earlier row or clashes with an existing user.
+    """
+
+    def __init__(self, report, batch_size=1000):
+        self.report = report
+        self.batch_size = batch_size
+        self.created = 0
+        self.skipped = 0
+
+    def run(self, records):
+        batch = []
+        for line_number, record, error in records:
+            if error is None:
+                try:
+                    user, profile = clean_record(record)
+                except ValidationError as validation_error:
+                    error = "; ".join(validation_error.messages)
+            if error is not None:
+                username = (record or {}).get("username")
+                self.skip(line_number, username, error)
+                continue
+
+            batch.append((line_number, user, profile))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        return self
+
+    def skip(self, line_number, username, reason):
+        self.skipped += 1
+        self.report(line_number, username, reason)
+
+    def import_batch(self, batch):
+        batch = self.drop_conflicts(batch)
+        if not batch:
+            return
+
+        hashes = iter(
+            hash_passwords(
+                [
+                    user["raw_password"]
+                    for _, user, _ in batch
+                    if user["raw_password"] is not None
+                ]
+            )
+        )
+        for _, user, _ in batch:
+            raw_password = user.pop("raw_password")
+            if raw_password is not None:
+                user["password"] = next(hashes)
+
+        with transaction.atomic():
+            User.objects.bulk_create(
+                [User(**user) for _, user, _ in batch],
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
+            # salted hashes are unique, a row with ours was inserted by us
+            # and not by a concurrent signup of the same username
+            stored = {
+                username: (user_id, password)
+                for username, user_id, password in User.objects.filter(
+                    username__in=[user["username"] for _, user, _ in batch]
+                ).values_list("username", "id", "password")
+            }
+
+            profiles = []
+            for line_number, user, profile in batch:
+                username = user["username"]
+                if username not in stored:
+                    # lost to the case insensitive email index
+                    self.skip(line_number, username, "Email already exists")
+                    continue
+                user_id, password = stored[username]
+                if password != user["password"]:
+                    self.skip(line_number, username, "Username already exists")
+                    continue
+                self.created += 1
+                if profile is not None:
+                    profiles.append(UserProfile(user_id=user_id, **profile))
+            UserProfile.objects.bulk_create(
+                profiles, batch_size=self.batch_size
+            )
+
+    def drop_conflicts(self, batch):
+        """
+        Reports rows repeating a username or email, case insensitively for
+        emails, of an earlier row or of an existing user
+        """
+        usernames = [user["username"] for _, user, _ in batch]
+        emails = [user["email"].lower() for _, user, _ in batch]
+        taken_usernames = set(
+            User.objects.filter(username__in=usernames).values_list(
+                "username", flat=True
+            )
+        )
+        taken_emails = set(
+            User.objects.annotate(email_lower=Lower("email"))
+            .filter(email_lower__in=emails)
+            .values_list("email_lower", flat=True)
+        )
+
+        kept = []
+        for line_number, user, profile in batch:
+            username, email = user["username"], user["email"].lower()
+            if username in taken_usernames:
+                self.skip(line_number, username, "Username already exists")
+            elif email in taken_emails:
+                self.skip(line_number, username, "Email already exists")
+            else:
+                taken_usernames.add(username)
+                taken_emails.add(email)
+                kept.append((line_number, user, profile))
+        return kept
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.users.importer import (
+    FORMATS,
+    UserImporter,
+    get_format,
+    iter_records,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports users and profiles from a CSV or JSONL file, streamed in "
+        "batches with passwords hashed in the hasher pool"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="File format, guessed from the extension by default",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of users inserted per batch",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or get_format(path)
+        if file_format is None:
+            raise CommandError("Unknown file format, pass --format")
+
+        def report(line_number, username, reason):
+            self.stderr.write(f"Line {line_number} ({username}): {reason}")
+
+        importer = UserImporter(report, batch_size=options["batch_size"])
+        with open(path, encoding="utf-8-sig", newline="") as lines:
+            importer.run(iter_records(lines, file_format))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {importer.created} users, "
+                f"skipped {importer.skipped}"
+            )
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_alter_userprofile_account_type"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="userprofile",
+            name="profile_image",
+            field=models.FileField(db_index=True, upload_to="profile_images/"),
+        ),
+    ]
@@ -0,0 +1,66 @@
+from django.core.management.base import CommandError
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+REPORT_LIMIT = 20
+
+
+def check_duplicate_emails(apps, schema_editor):
+    """
+    Aborts with the emails the index would reject, they have to be made
+    unique by hand before migrating again
+    """
+    User = apps.get_model("auth", "User")
+    duplicates = list(
+        User.objects.exclude(email="")
+        .annotate(email_lower=Lower("email"))
+        .values("email_lower")
+        .annotate(users=Count("id"))
+        .filter(users__gt=1)
+        .order_by("email_lower")
+        .values_list("email_lower", "users")
+    )
+    if not duplicates:
+        return
+
+    lines = [
+        f"  {email} ({users} users)"
+        for email, users in duplicates[:REPORT_LIMIT]
+    ]
+    if len(duplicates) > REPORT_LIMIT:
+        lines.append(f"  and {len(duplicates) - REPORT_LIMIT} more")
+    raise CommandError(
+        "These emails are used by several users when compared case "
+        "insensitively, change them before applying "
+        "users.0004_user_email_ci_unique:\n" + "\n".join(lines)
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    Case insensitive unique email on auth_user, signups rely on it instead
+    of checking for an existing email first. Blank emails are left out.
+
+    auth.User belongs to django.contrib.auth, so the index cannot be
+    declared as a UniqueConstraint in this app's model state and is
+    created with SQL.
+    """
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("users", "0003_profile_image_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            check_duplicate_emails, reverse_code=migrations.RunPython.noop
+        ),
+        migrations.RunSQL(
+            sql=(
+                "CREATE UNIQUE INDEX user_email_ci_unique "
+                "ON auth_user (LOWER(email)) WHERE email <> ''"
+            ),
+            reverse_sql="DROP INDEX user_email_ci_unique",
+        ),
+    ]
@@ -22,7 +22,9 @@ class UserProfile(TimeStampedModel):
     )
     name = models.CharField(max_length=100, db_index=True)
     mobile_number = models.CharField(max_length=10, db_index=True)
-    profile_image = models.FileField(upload_to="profile_images/")
+    profile_image = models.FileField(
+        upload_to="profile_images/", db_index=True
+    )
     bio = models.TextField(null=True, blank=True)
     date_of_birth = models.DateField()
 
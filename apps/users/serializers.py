@@ -1,6 +1,8 @@
 import re
 from rest_framework import serializers
 
+from django.db.models.functions import Lower
+
 from apps.users.models import UserProfile, User
 
 
@@ -41,3 +43,19 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "email", "username", "profile"]
+
+    def validate_email(self, email):
+        # same expression and condition as user_email_ci_unique, so the
+        # lookup is served by that index
+        users = (
+            User.objects.annotate(email_lower=Lower("email"))
+            .filter(email_lower=email.lower())
+            .exclude(email="")
+        )
+        if self.instance is not None:
+            users = users.exclude(pk=self.instance.pk)
+        if email and users.exists():
+            raise serializers.ValidationError(
+                "User with provided email already exists!"
+            )
+        return email
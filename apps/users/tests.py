@@ -1,10 +1,21 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
 from rest_framework.test import APITestCase
 from rest_framework import status
 
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
 from django.core.files.uploadedfile import SimpleUploadedFile
 
+from apps.users.forms import get_conflicting_field
 from apps.users.models import UserProfile
 from apps.users.factories import (
     UserFactory,
@@ -21,6 +32,9 @@ class TestUserCreation(APITestCase, TestCase):
     """
     Tests below APIs
     1. User creation
+    2. User creation is a single insert
+    3. Duplicate usernames and emails are reported
+    4. Email updates are checked case insensitively
     """
 
     def setUp(self):
@@ -41,12 +55,117 @@ class TestUserCreation(APITestCase, TestCase):
         self.assertTrue(User.objects.filter(email=email).exists())
         self.user = User.objects.get(email=email)
 
+    def test_create_account_single_insert(self):
+        url = reverse("user-creation")
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                url, data=self.user_creation_data, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        statements = [
+            query["sql"]
+            for query in context.captured_queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith("INSERT"))
+        self.assertTrue(
+            User.objects.get(username="test1").check_password("Codal@123")
+        )
+
+    def test_create_account_conflicts(self):
+        url = reverse("user-creation")
+        self.client.post(url, data=self.user_creation_data, format="json")
+
+        response = self.client.post(
+            url,
+            data={**self.user_creation_data, "email": "new@codal.com"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("username", response.json())
+
+        response = self.client.post(
+            url,
+            data={
+                **self.user_creation_data,
+                "username": "test2",
+                "email": "TEST1@codal.com",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("email", response.json())
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_update_email_conflict(self):
+        user = UserFactory.create(email="first@codal.com")
+        UserFactory.create(email="second@codal.com")
+        application = ApplicationFactory.create()
+        access_token = AccessTokenFactory.create(
+            user=user, application=application
+        ).token
+        headers = {"Authorization": f"Bearer {access_token}"}
+        url = f"{reverse('user-list')}{user.id}/"
+
+        response = self.client.patch(
+            url, {"email": "SECOND@codal.com"}, headers=headers, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("email", response.json())
+
+        response = self.client.patch(
+            url, {"email": "First@codal.com"}, headers=headers, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # a write racing the validator is reported by the index
+        with mock.patch(
+            "apps.users.serializers.UserSerializer.validate_email",
+            side_effect=lambda email: email,
+        ):
+            response = self.client.patch(
+                url,
+                {"email": "SECOND@codal.com"},
+                headers=headers,
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("email", response.json())
+
+    def test_conflicting_field(self):
+        class Diag:
+            constraint_name = "auth_user_username_key"
+
+        error = IntegrityError(
+            'duplicate key value violates unique constraint "'
+            'auth_user_username_key"\n'
+            "DETAIL:  Key (username)=(myemail) already exists."
+        )
+        self.assertEqual(get_conflicting_field(error), "username")
+
+        cause = Exception()
+        cause.diag = Diag()
+        error = IntegrityError("user_email_ci_unique")
+        error.__cause__ = cause
+        self.assertEqual(get_conflicting_field(error), "username")
+
+        error = IntegrityError(
+            "UNIQUE constraint failed: index 'user_email_ci_unique'"
+        )
+        self.assertEqual(get_conflicting_field(error), "email")
+        self.assertIsNone(
+            get_conflicting_field(IntegrityError("NOT NULL constraint"))
+        )
+
 
 class TestUserProfileCreation(APITestCase):
     """
     Tests below APIs
     1. User profile creation
     2. User profile image updation
+    3. Replaced profile images shared with other profiles are kept
     """
 
     def setUp(self):
@@ -90,3 +209,133 @@ class TestUserProfileCreation(APITestCase):
         )
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_profile_image_release(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        overrides = override_settings(
+            MEDIA_ROOT=media_root.name,
+            MEDIA_RELEASE_IN_BACKGROUND=False,
+            MEDIA_RELEASE_GRACE=0,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        users = UserFactory.create_batch(2)
+        application = ApplicationFactory.create()
+
+        def upload(user, content):
+            UserProfile.objects.get_or_create(
+                user=user,
+                defaults={"name": "Test", "date_of_birth": "1998-07-03"},
+            )
+            token = AccessTokenFactory.create(
+                user=user, application=application
+            ).token
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse("user-profile-image", kwargs={"pk": user.id}),
+                    content,
+                    content_type="image/png",
+                    headers={
+                        "Authorization": f"Bearer {token}",
+                        "Content-Disposition": "attachment; filename=a.png",
+                    },
+                )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return UserProfile.objects.get(user=user).profile_image.name
+
+        shared = upload(users[0], b"same avatar")
+        self.assertEqual(upload(users[1], b"same avatar"), shared)
+
+        upload(users[0], b"new avatar")
+        self.assertTrue(default_storage.exists(shared))
+
+        upload(users[1], b"other avatar")
+        self.assertFalse(default_storage.exists(shared))
+
+
+@override_settings(PASSWORD_HASH_WORKERS=0)
+class TestUserImport(APITestCase):
+    """
+    Tests below APIs
+    1. Bulk user import command from CSV
+    2. Bulk user import endpoint from JSONL, admin only
+    """
+
+    def test_import_users_command(self):
+        UserFactory.create(username="taken", email="taken@codal.com")
+        rows = [
+            "username,email,password,name,mobile_number,date_of_birth",
+            "alice,alice@codal.com,Codal@123,Alice,9033304748,1998-07-03",
+            "bob,bob@codal.com,Codal@123,,,",
+            "alice,other@codal.com,Codal@123,,,",
+            "carol,TAKEN@codal.com,Codal@123,,,",
+            "dave,dave@codal.com,,,,",
+            "erin,erin@codal.com,Codal@123,Erin,123,1998-07-03",
+        ]
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".csv", delete=False
+        ) as users_file:
+            users_file.write("\n".join(rows))
+        self.addCleanup(os.remove, users_file.name)
+
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            "import_users",
+            users_file.name,
+            "--batch-size=2",
+            stdout=stdout,
+            stderr=stderr,
+        )
+
+        self.assertIn("Created 2 users, skipped 4", stdout.getvalue())
+        for line in ("Line 4", "Line 5", "Line 6", "Line 7"):
+            self.assertIn(line, stderr.getvalue())
+
+        alice = User.objects.get(username="alice")
+        self.assertTrue(alice.check_password("Codal@123"))
+        self.assertEqual(alice.profile.mobile_number, "9033304748")
+        bob = User.objects.get(username="bob")
+        self.assertFalse(UserProfile.objects.filter(user=bob).exists())
+
+    def test_import_users_endpoint(self):
+        admin = UserFactory.create(is_staff=True)
+        application = ApplicationFactory.create()
+        token = AccessTokenFactory.create(
+            user=admin, application=application
+        ).token
+        url = reverse("user-import")
+
+        lines = [
+            json.dumps(
+                {"username": "frank", "email": "f@codal.com", "password": "x"}
+            ),
+            "not json",
+            json.dumps({"username": "frank", "email": "g@codal.com"}),
+        ]
+        upload = SimpleUploadedFile("users.jsonl", "\n".join(lines).encode())
+        response = self.client.post(
+            url,
+            {"file": upload},
+            headers={"Authorization": f"Bearer {token}"},
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["created"], 1)
+        self.assertEqual(
+            [row["line"] for row in response.json()["skipped_rows"]], [2, 3]
+        )
+        self.assertTrue(User.objects.filter(username="frank").exists())
+
+        user_token = AccessTokenFactory.create(
+            user=UserFactory.create(), application=application
+        ).token
+        response = self.client.post(
+            url,
+            {"file": upload},
+            headers={"Authorization": f"Bearer {user_token}"},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -14,6 +14,7 @@ urlpatterns = [
         views.UserCreationView.as_view(),
         name="user-detail",
     ),
+    path("import", views.UserImportView.as_view(), name="user-import"),
 ]
 
 urlpatterns += default_router.urls
@@ -1,15 +1,19 @@
-import os
+import codecs
+
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import viewsets
 from rest_framework import permissions
-from rest_framework.parsers import FileUploadParser
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FileUploadParser, MultiPartParser
 
-from django.db import transaction
+from django.db import IntegrityError, transaction
 
-from apps.users.forms import UserCreationForm
+from apps.common.media import queue_release
+from apps.users.forms import UserCreationForm, get_conflicting_field
+from apps.users.importer import UserImporter, get_format, iter_records
 from apps.users.models import User, UserProfile
 from apps.users.serializers import UserSerializer, UserProfileSerializer
 
@@ -26,20 +30,30 @@ class UserCreationView(APIView):
         data = request.data
 
         user_form = UserCreationForm(data=data)
-        if user_form.is_valid():
+        if not user_form.is_valid():
+            return Response(
+                user_form.errors, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # a single INSERT with the hashed password, conflicts come back
+        # from the unique indexes
+        user = user_form.save(commit=False)
+        user.set_password(user_form.cleaned_data.get("password"))
+        try:
             with transaction.atomic():
-                user = user_form.save()
-                password = user_form.cleaned_data.get("password")
-                user.set_password(password)
                 user.save()
-
-            serializer = UserSerializer(instance=user)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        else:
+        except IntegrityError as error:
+            if not user_form.add_integrity_error(error):
+                raise
             return Response(
                 user_form.errors, status=status.HTTP_400_BAD_REQUEST
             )
 
+        # a new user has no profile, spares the serializer a SELECT
+        User.profile.related.set_cached_value(user, None)
+        serializer = UserSerializer(instance=user)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
 class UserViewSet(viewsets.ModelViewSet):
     """
@@ -63,6 +77,19 @@ class UserViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
 
+    def perform_update(self, serializer):
+        # the email validator can race a concurrent write of the same email
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError as error:
+            field = get_conflicting_field(error)
+            if field is None:
+                raise
+            raise ValidationError(
+                {field: [f"User with provided {field} already exists!"]}
+            )
+
     @action(
         detail=True, methods=["POST"], serializer_class=UserProfileSerializer
     )
@@ -122,11 +149,62 @@ class UserViewSet(viewsets.ModelViewSet):
                 }
             )
 
-        if profile.profile_image is not None:
-            try:
-                os.remove(profile.profile_image.path)
-            except (FileNotFoundError, ValueError):
-                pass
+        old_image = profile.profile_image.name
         profile.profile_image = file
-        profile.save()
+        with transaction.atomic():
+            profile.save()
+            # deleted in the background, and only if no other upload
+            # shares the stored file
+            queue_release(old_image)
         return Response({"success": True})
+
+
+class UserImportView(APIView):
+    """
+    Imports users and profiles from an uploaded CSV or JSONL file
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    # rows not imported listed in the response, the counts cover all
+    REPORTED_ROWS = 100
+
+    def post(self, request):
+        file = request.data.get("file")
+        if file is None:
+            return Response(
+                {"file": ["This field is required."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        file_format = request.data.get("format") or get_format(file.name)
+        if file_format not in ("csv", "jsonl"):
+            return Response(
+                {"format": ["Upload a .csv or .jsonl file."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        skipped = []
+
+        def report(line_number, username, reason):
+            if len(skipped) < self.REPORTED_ROWS:
+                skipped.append(
+                    {
+                        "line": line_number,
+                        "username": username,
+                        "reason": reason,
+                    }
+                )
+
+        # large uploads are spooled to disk by the upload handlers and
+        # read back line by line
+        lines = codecs.iterdecode(file, "utf-8-sig")
+        importer = UserImporter(report).run(iter_records(lines, file_format))
+        return Response(
+            {
+                "created": importer.created,
+                "skipped": importer.skipped,
+                "skipped_rows": skipped,
+            },
+            status=status.HTTP_200_OK,
+        )
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -127,9 +128,120 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
 # CUSTOM SETTINGS
+TESTING = sys.argv[1:2] == ["test"]
+
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/media/"
 
+# Uploads are stored under the hash of their content and deduplicated,
+# a file is only deleted once no field in MEDIA_REFERENCE_FIELDS uses it
+STORAGES = {
+    "default": {"BACKEND": "apps.common.storage.ContentAddressedStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+    },
+}
+MEDIA_REFERENCE_FIELDS = [
+    "posts.Post.file",
+    "posts.PostVariant.file",
+    "users.UserProfile.profile_image",
+]
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Uploads keep their extension only when it is listed here, and media is
+# only rendered inline for these content types. Anything else is sent as
+# a sandboxed attachment so an uploaded page or script never runs on this
+# origin
+MEDIA_EXTENSIONS = [
+    "gif",
+    "heic",
+    "jpeg",
+    "jpg",
+    "m4v",
+    "mov",
+    "mp4",
+    "png",
+    "webm",
+    "webp",
+]
+MEDIA_INLINE_TYPES = [
+    "image/gif",
+    "image/heic",
+    "image/jpeg",
+    "image/png",
+    "image/webp",
+    "video/mp4",
+    "video/quicktime",
+    "video/webm",
+]
+
+# Replaced and deleted files are removed by a background thread in
+# batches, False removes them in process right after commit
+MEDIA_RELEASE_IN_BACKGROUND = True
+MEDIA_RELEASE_BATCH_SIZE = 100
+# Files written or deduplicated onto this many seconds before their
+# release are kept for collect_media_garbage, the upload sharing them may
+# still be committing its row
+MEDIA_RELEASE_GRACE = 60 * 10
+
+# Media is streamed by the app unless MEDIA_SENDFILE names the header a
+# front proxy serves files from: "X-Accel-Redirect" for nginx, with an
+# internal location at MEDIA_SENDFILE_PREFIX aliased to MEDIA_ROOT, or
+# "X-Sendfile" for Apache and lighttpd
+MEDIA_SENDFILE = None
+MEDIA_SENDFILE_PREFIX = "/protected-media/"
+
+# Number of likes and comments embedded in feed and post detail payloads
+POST_PREVIEW_LIMIT = 3
+
+# The default cache is in process, so version bumps only reach the worker
+# that handled the write and the timeouts below bound how long the other
+# workers serve stale data. Point "default" at a shared backend such as
+# memcached or redis to rely on the version bumps alone. A feed page of
+# 100 posts stores about 200 keys, fragments and their versions, so the
+# entry limit is sized for thousands of pages rather than the default 300
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 200000},
+    }
+}
+
+# Cached feed pages hold post ids under a per-viewer generation which is
+# bumped when posts enter or leave the feed
+FEED_CACHE_TIMEOUT = 60
+
+# Serialized posts shared by all feeds under a per-post version which is
+# bumped on likes, comments and edits
+POST_FRAGMENT_CACHE_TIMEOUT = 60
+
+# Buffer like taps in process and write them in bulk every few seconds,
+# an interval of 0 leaves flushing to explicit like_buffer.flush() calls.
+# A batch that keeps failing is dropped after the given number of retries
+POST_LIKE_WRITE_BEHIND = False
+POST_LIKE_FLUSH_INTERVAL = 2
+POST_LIKE_FLUSH_RETRIES = 3
+
+# Longest edge in pixels of the renditions generated for every post, and
+# the size of the process pool rendering them, 0 renders in process
+POST_VARIANT_SIZES = {"grid": 320, "feed": 1080, "full": 2048}
+POST_MEDIA_WORKERS = 2
+
+# Resumable uploads are appended to files under UPLOAD_SESSION_ROOT, a
+# session expires when no chunk arrived for UPLOAD_SESSION_TTL seconds.
+# A chunk or finalization claims its session for UPLOAD_CLAIM_TIMEOUT
+# seconds at most, so a crashed request does not block the upload
+UPLOAD_SESSION_ROOT = os.path.join(BASE_DIR, "uploads")
+UPLOAD_SESSION_TTL = 60 * 60 * 24
+UPLOAD_MAX_SIZE = 1024 * 1024 * 1024
+UPLOAD_CHUNK_MAX_SIZE = 8 * 1024 * 1024
+UPLOAD_CLAIM_TIMEOUT = 60 * 5
+
+# Friend id sets used by read permission checks are dropped on every
+# Friend write, the timeout bounds staleness in other workers while the
+# default cache is per process. Timeline fan-out never reads them
+FRIEND_GRAPH_CACHE_TIMEOUT = 60
+
 CREATED_APPS = ["apps.common", "apps.posts", "apps.users", "apps.friends"]
 
 INTERNAL_APPS = [
@@ -144,9 +256,25 @@ INSTALLED_APPS += CREATED_APPS + INTERNAL_APPS
 # REST FRAMEWORK SETTINGS
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "oauth2_provider.contrib.rest_framework.OAuth2Authentication"
+        "apps.common.authentication.CachedOAuth2Authentication"
     ]
 }
 
+# Validated access tokens are kept per process for at most this many
+# seconds, which bounds how long a token revoked elsewhere is accepted
+AUTH_TOKEN_CACHE_TTL = 60
+AUTH_TOKEN_CACHE_SIZE = 10000
+
+# Logins reuse an unexpired token with at least this many seconds left
+ACCESS_TOKEN_REUSE_MIN_LIFETIME = 60 * 60
+
+# Password hashes are checked in a pool of this many processes started by
+# each web process on its first login, so N web workers run N times as
+# many hashers. 0 checks them in process, as the test runner always does.
+# Rejected logins and accepted client secrets are remembered for
+# LOGIN_CREDENTIAL_CACHE_TIMEOUT seconds
+PASSWORD_HASH_WORKERS = 0 if TESTING else 2
+LOGIN_CREDENTIAL_CACHE_TIMEOUT = 60
+
 # OAuth2 Provider settings
 OAUTH2_PROVIDER = {"ACCESS_TOKEN_EXPIRE_SECONDS": 86400}
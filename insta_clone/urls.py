@@ -1,13 +1,16 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
 
 from rest_framework import permissions
 
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from apps.common.views import serve_media
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Insta Clone Available APIs",
@@ -58,5 +61,11 @@ urlpatterns += [
 ]
 
 
-# static and media patterns
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# media patterns, offloaded to the front proxy when MEDIA_SENDFILE is set
+urlpatterns += [
+    re_path(
+        rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<path>.*)$",
+        serve_media,
+        name="media",
+    )
+]